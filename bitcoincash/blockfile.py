@@ -0,0 +1,214 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Reading of blk*.dat and bootstrap.dat block files
+
+Both file types are a sequence of frames, each made up of the network's
+DB_MAGIC, the length of the block as a little-endian uint32, and the
+serialized block. Files are memory-mapped, so only the block currently being
+decoded is copied into Python memory.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import mmap
+import os
+import struct
+
+import bitcoincash
+from bitcoincash.core import CBlockHeader, LazyCBlock
+from bitcoincash.core.serialize import (
+        BytesSerializer,
+        Serializable,
+        VarIntSerializer,
+        ser_read,
+        )
+
+
+class BlockFileError(Exception):
+    """Block file is corrupt"""
+
+
+class BlockFile(object):
+    """A memory-mapped block file
+
+    Offsets are the position of the serialized block in the file, just after
+    the magic and length, the same as a node's CDiskBlockPos.
+    """
+
+    __frame_length = struct.Struct(b'<I')
+
+    def __init__(self, path, magic=None):
+        if magic is None:
+            magic = bitcoincash.params.DB_MAGIC
+        self.path = path
+        self.magic = magic
+
+        with open(path, 'rb') as fd:
+            if os.fstat(fd.fileno()).st_size:
+                self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # mmap can't map empty files
+                self._mmap = b''
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._mmap)
+
+    def iter_frames(self, start=0):
+        """Iterate over (offset, length) of the blocks in the file
+
+        Data between frames that doesn't start with the magic is skipped, as
+        the node does on a reindex. The node preallocates block files with
+        zeros, so the iteration also stops at the first zeroed frame.
+        """
+        mm = self._mmap
+        magic = self.magic
+        end = len(mm)
+        pos = start
+        while pos + 8 <= end:
+            if mm[pos:pos+4] != magic:
+                if mm[pos:pos+4] == b'\x00\x00\x00\x00':
+                    break
+                pos = mm.find(magic, pos + 1)
+                if pos == -1:
+                    break
+                continue
+
+            (length,) = self.__frame_length.unpack_from(mm, pos + 4)
+            pos += 8
+            if pos + length > end:
+                raise BlockFileError('%s: block at offset %i truncated; %i bytes expected, %i found' %
+                                     (self.path, pos, length, end - pos))
+            yield pos, length
+            pos += length
+
+    def read_header(self, offset):
+        """Read the header of the block at offset"""
+        return CBlockHeader.deserialize(self._mmap[offset:offset+80])
+
+    def read_block(self, offset, length=None):
+        """Read the block at offset
+
+        Returns a LazyCBlock; transactions are decoded on access.
+        """
+        if length is None:
+            (length,) = self.__frame_length.unpack_from(self._mmap, offset - 4)
+        return LazyCBlock.deserialize(self._mmap[offset:offset+length])
+
+    def __iter__(self):
+        return self.iter_blocks()
+
+    def iter_blocks(self, start=0):
+        """Iterate over (offset, header, block) for the blocks in the file"""
+        for offset, length in self.iter_frames(start):
+            block = self.read_block(offset, length)
+            yield offset, block.get_header(), block
+
+
+def iter_blocks(paths, magic=None):
+    """Iterate over (path, offset, header, block) for a sequence of block files"""
+    if isinstance(paths, str):
+        paths = (paths,)
+    for path in paths:
+        with BlockFile(path, magic) as blockfile:
+            for offset, header, block in blockfile:
+                yield path, offset, header, block
+
+
+class BlockIndex(Serializable):
+    """Index of block hash -> (path, offset) over a set of block files
+
+    The index is serializable, so it can be saved with save() and reloaded
+    with load() rather than rescanning the files.
+    """
+
+    __entry = struct.Struct(b'<32sIQ')
+
+    def __init__(self, paths=(), entries=None):
+        self.paths = list(paths)
+        self.entries = {} if entries is None else entries
+
+    def add_file(self, path, magic=None):
+        """Scan a block file, adding its blocks to the index"""
+        file_idx = len(self.paths)
+        self.paths.append(path)
+        with BlockFile(path, magic) as blockfile:
+            for offset, length in blockfile.iter_frames():
+                block_hash = blockfile.read_header(offset).GetHash()
+                self.entries[block_hash] = (file_idx, offset)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.entries
+
+    def lookup(self, block_hash):
+        """Return (path, offset) of a block
+
+        Raises KeyError if the block isn't in the index.
+        """
+        file_idx, offset = self.entries[block_hash]
+        return self.paths[file_idx], offset
+
+    def read_block(self, block_hash, magic=None):
+        """Read a block by hash"""
+        path, offset = self.lookup(block_hash)
+        with BlockFile(path, magic) as blockfile:
+            return blockfile.read_block(offset)
+
+    @classmethod
+    def stream_deserialize(cls, f):
+        paths = [BytesSerializer.stream_deserialize(f).decode('utf-8')
+                 for i in range(VarIntSerializer.stream_deserialize(f))]
+        entries = {}
+        for i in range(VarIntSerializer.stream_deserialize(f)):
+            block_hash, file_idx, offset = cls.__entry.unpack(ser_read(f, cls.__entry.size))
+            entries[block_hash] = (file_idx, offset)
+        return cls(paths, entries)
+
+    def stream_serialize(self, f):
+        VarIntSerializer.stream_serialize(len(self.paths), f)
+        for path in self.paths:
+            BytesSerializer.stream_serialize(path.encode('utf-8'), f)
+        VarIntSerializer.stream_serialize(len(self.entries), f)
+        for block_hash, (file_idx, offset) in self.entries.items():
+            f.write(self.__entry.pack(block_hash, file_idx, offset))
+
+    def save(self, path):
+        with open(path, 'wb') as fd:
+            self.stream_serialize(fd)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fd:
+            return cls.stream_deserialize(fd)
+
+    def __repr__(self):
+        return 'BlockIndex(<%d files, %d blocks>)' % (len(self.paths), len(self.entries))
+
+
+__all__ = (
+        'BlockFileError',
+        'BlockFile',
+        'iter_blocks',
+        'BlockIndex',
+)
@@ -11,7 +11,9 @@
 
 from __future__ import absolute_import, division, print_function
 
+import array
 import binascii
+import collections.abc
 import struct
 import sys
 import time
@@ -115,15 +117,30 @@ class ValidationError(Exception):
 
 def __make_mutable(cls):
     # For speed we use a class decorator that removes the immutable
-    # restrictions directly. In addition the modified behavior of GetHash() and
-    # hash() is undone.
+    # restrictions directly. In addition the modified behavior of serialize(),
+    # GetHash() and hash() is undone.
     cls.__setattr__ = object.__setattr__
     cls.__delattr__ = object.__delattr__
+    cls.serialize = Serializable.serialize
     cls.GetHash = Serializable.GetHash
     cls.__hash__ = Serializable.__hash__
     return cls
 
 
+# Precompiled codecs for the fixed-size parts of transactions and blocks.
+# Where fields are adjacent they're packed and unpacked in one call.
+_struct_int32 = struct.Struct(b"<i")
+_struct_uint32 = struct.Struct(b"<I")
+_struct_int64 = struct.Struct(b"<q")
+_struct_outpoint = struct.Struct(b"<32sI")
+_struct_header = struct.Struct(b"<i32s32sIII")
+
+# Fixed-size parts of inputs and outputs, up to and including the first byte
+# of the script length.
+_struct_outpoint_len = struct.Struct(b"<32sIB")
+_struct_value_len = struct.Struct(b"<qB")
+
+
 class COutPoint(ImmutableSerializable):
     """The combination of a transaction hash and an index n into its vout"""
     __slots__ = ['hash', 'n']
@@ -138,14 +155,25 @@ class COutPoint(ImmutableSerializable):
 
     @classmethod
     def stream_deserialize(cls, f):
-        hash = ser_read(f,32)
-        n = struct.unpack(b"<I", ser_read(f,4))[0]
+        (hash, n) = _struct_outpoint.unpack(ser_read(f,36))
         return cls(hash, n)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        (hash, n) = ser_unpack_from(_struct_outpoint, buf, pos)
+        return cls(hash, n), pos + 36
+
     def stream_serialize(self, f):
         assert len(self.hash) == 32
-        f.write(self.hash)
-        f.write(struct.pack(b"<I", self.n))
+        f.write(_struct_outpoint.pack(self.hash, self.n))
+
+    def buffer_serialize(self, buf, pos=0):
+        assert len(self.hash) == 32
+        _struct_outpoint.pack_into(buf, pos, self.hash, self.n)
+        return pos + 36
+
+    def GetSerializeSize(self):
+        return 36
 
     def is_null(self):
         return ((self.hash == b'\x00'*32) and (self.n == 0xffffffff))
@@ -202,13 +230,31 @@ class CTxIn(ImmutableSerializable):
     def stream_deserialize(cls, f):
         prevout = COutPoint.stream_deserialize(f)
         scriptSig = script.CScript(BytesSerializer.stream_deserialize(f))
-        nSequence = struct.unpack(b"<I", ser_read(f,4))[0]
+        nSequence = _struct_uint32.unpack(ser_read(f,4))[0]
         return cls(prevout, scriptSig, nSequence)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        prevout, pos = COutPoint.buffer_deserialize(buf, pos)
+        l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+        scriptSig, pos = ser_read_from(buf, pos, l)
+        nSequence = ser_unpack_from(_struct_uint32, buf, pos)[0]
+        return cls(prevout, script.CScript(scriptSig), nSequence), pos + 4
+
     def stream_serialize(self, f):
         COutPoint.stream_serialize(self.prevout, f)
         BytesSerializer.stream_serialize(self.scriptSig, f)
-        f.write(struct.pack(b"<I", self.nSequence))
+        f.write(_struct_uint32.pack(self.nSequence))
+
+    def buffer_serialize(self, buf, pos=0):
+        pos = COutPoint.buffer_serialize(self.prevout, buf, pos)
+        pos = BytesSerializer.buffer_serialize(self.scriptSig, buf, pos)
+        _struct_uint32.pack_into(buf, pos, self.nSequence)
+        return pos + 4
+
+    def GetSerializeSize(self):
+        l = len(self.scriptSig)
+        return 36 + VarIntSerializer.serialized_size(l) + l + 4
 
     def is_final(self):
         return (self.nSequence == 0xffffffff)
@@ -265,14 +311,29 @@ class CTxOut(ImmutableSerializable):
 
     @classmethod
     def stream_deserialize(cls, f):
-        nValue = struct.unpack(b"<q", ser_read(f,8))[0]
+        nValue = _struct_int64.unpack(ser_read(f,8))[0]
         scriptPubKey = script.CScript(BytesSerializer.stream_deserialize(f))
         return cls(nValue, scriptPubKey)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        nValue = ser_unpack_from(_struct_int64, buf, pos)[0]
+        l, pos = VarIntSerializer.buffer_deserialize(buf, pos + 8)
+        scriptPubKey, pos = ser_read_from(buf, pos, l)
+        return cls(nValue, script.CScript(scriptPubKey)), pos
+
     def stream_serialize(self, f):
-        f.write(struct.pack(b"<q", self.nValue))
+        f.write(_struct_int64.pack(self.nValue))
         BytesSerializer.stream_serialize(self.scriptPubKey, f)
 
+    def buffer_serialize(self, buf, pos=0):
+        _struct_int64.pack_into(buf, pos, self.nValue)
+        return BytesSerializer.buffer_serialize(self.scriptPubKey, buf, pos + 8)
+
+    def GetSerializeSize(self):
+        l = len(self.scriptPubKey)
+        return 8 + VarIntSerializer.serialized_size(l) + l
+
     def is_valid(self):
         if not MoneyRange(self.nValue):
             return False
@@ -309,6 +370,164 @@ class CMutableTxOut(CTxOut):
         """Create a fullly mutable copy of an existing TxOut"""
         return cls(txout.nValue, txout.scriptPubKey)
 
+class _CopyOnWriteView(object):
+    """Mixin for a mutable view of a shared immutable object
+
+    Fields that haven't been set are read from the original. The first
+    assignment copies every field into the view, after which it's an ordinary
+    mutable object and _original is None.
+    """
+    __slots__ = []
+
+    def __getattr__(self, name):
+        # Only called for fields that haven't been set yet
+        if name.startswith('_'):
+            raise AttributeError(name)
+        original = self._original
+        if original is None:
+            raise AttributeError(name)
+        return getattr(original, name)
+
+    def __setattr__(self, name, value):
+        self._materialize()
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        self._materialize()
+        object.__delattr__(self, name)
+
+    def _materialize(self):
+        if self._original is not None:
+            values = [getattr(self, name) for name in self._fields]
+            object.__setattr__(self, '_original', None)
+            for name, value in zip(self._fields, values):
+                object.__setattr__(self, name, value)
+
+    @classmethod
+    def _view(cls, original):
+        self = object.__new__(cls)
+        object.__setattr__(self, '_original', original)
+        return self
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are plain mutable objects
+        return (self._mutable_cls, tuple(getattr(self, name) for name in self._fields))
+
+class _CopyOnWriteOutPoint(_CopyOnWriteView, CMutableOutPoint):
+    """A view of the prevout of a _CopyOnWriteTxIn"""
+    __slots__ = ['_original', '_owner']
+    _fields = ('hash', 'n')
+    _mutable_cls = CMutableOutPoint
+
+    def _materialize(self):
+        if self._original is not None:
+            super(_CopyOnWriteOutPoint, self)._materialize()
+            self._owner._materialize()
+
+class _CopyOnWriteTxIn(_CopyOnWriteView, CMutableTxIn):
+    """A CMutableTxIn view of a shared CTxIn"""
+    __slots__ = ['_original']
+    _fields = ('prevout', 'scriptSig', 'nSequence')
+    _mutable_cls = CMutableTxIn
+
+    def __getattr__(self, name):
+        value = super(_CopyOnWriteTxIn, self).__getattr__(name)
+        if name == 'prevout':
+            # The prevout can be modified in place, so it gets a view of its
+            # own that copies this input when it's written to.
+            value = _CopyOnWriteOutPoint._view(value)
+            object.__setattr__(value, '_owner', self)
+            object.__setattr__(self, 'prevout', value)
+        return value
+
+class _CopyOnWriteTxOut(_CopyOnWriteView, CMutableTxOut):
+    """A CMutableTxOut view of a shared CTxOut"""
+    __slots__ = ['_original']
+    _fields = ('nValue', 'scriptPubKey')
+    _mutable_cls = CMutableTxOut
+
+class _CopyOnWriteList(list):
+    """A list of mutable objects that shares the immutable originals
+
+    Created by CMutableTransaction.from_tx() for vin and vout. Items start out
+    as the immutable inputs or outputs of the original transaction. Reading
+    one through the list replaces it with a mutable view that reads through to
+    the original, and only assigning to one of the view's fields copies it.
+    Serialization reads the originals of unmodified views directly.
+    """
+    __slots__ = ['_shared_cls', '_view_cls', '_has_views']
+
+    def __init__(self, items=(), shared_cls=None, view_cls=None):
+        super(_CopyOnWriteList, self).__init__(items)
+        self._shared_cls = shared_cls
+        self._view_cls = view_cls
+        self._has_views = False
+
+    def _get_view(self, i):
+        item = list.__getitem__(self, i)
+        if item.__class__ is self._shared_cls:
+            item = self._view_cls._view(item)
+            list.__setitem__(self, i, item)
+            self._has_views = True
+        return item
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get_view(j) for j in range(*i.indices(len(self)))]
+        return self._get_view(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get_view(i)
+
+    def __reversed__(self):
+        for i in reversed(range(len(self))):
+            yield self._get_view(i)
+
+    def pop(self, i=-1):
+        item = self._get_view(i)
+        list.pop(self, i)
+        return item
+
+    # list's own copy, concatenation and repetition read the items directly,
+    # so they'd hand out the shared immutable ones. Their results are plain
+    # lists of the mutable views instead.
+    def copy(self):
+        return list(self)
+
+    def __add__(self, other):
+        return list(self) + other
+
+    def __radd__(self, other):
+        return other + list(self)
+
+    def __mul__(self, n):
+        return list(self) * n
+
+    __rmul__ = __mul__
+
+    def __reduce_ex__(self, protocol):
+        # Covers copy.copy(), copy.deepcopy() and pickling
+        return (list, (list(self),))
+
+    def shared(self):
+        """Return a plain list of the items, with unmodified views replaced by
+        their originals"""
+        items = list.copy(self)
+        if self._has_views:
+            view_cls = self._view_cls
+            for i, item in enumerate(items):
+                if item.__class__ is view_cls and item._original is not None:
+                    items[i] = item._original
+        return items
+
+
+def _shared(items):
+    if items.__class__ is _CopyOnWriteList:
+        return items.shared()
+    return items
+
+
 class CTransaction(ImmutableSerializable):
     """A transaction"""
     __slots__ = ['nVersion', 'vin', 'vout', 'nLockTime']
@@ -325,22 +544,205 @@ class CTransaction(ImmutableSerializable):
         object.__setattr__(self, 'nLockTime', nLockTime)
 
         object.__setattr__(self, 'nVersion', nVersion)
-        object.__setattr__(self, 'vin', tuple(CTxIn.from_txin(txin) for txin in vin))
-        object.__setattr__(self, 'vout', tuple(CTxOut.from_txout(txout) for txout in vout))
+        object.__setattr__(self, 'vin', tuple(CTxIn.from_txin(txin) for txin in _shared(vin)))
+        object.__setattr__(self, 'vout', tuple(CTxOut.from_txout(txout) for txout in _shared(vout)))
 
     @classmethod
     def stream_deserialize(cls, f):
-        nVersion = struct.unpack(b"<i", ser_read(f,4))[0]
+        nVersion = _struct_int32.unpack(ser_read(f,4))[0]
         vin = VectorSerializer.stream_deserialize(CTxIn, f)
         vout = VectorSerializer.stream_deserialize(CTxOut, f)
-        nLockTime = struct.unpack(b"<I", ser_read(f,4))[0]
+        nLockTime = _struct_uint32.unpack(ser_read(f,4))[0]
         return cls(vin, vout, nLockTime, nVersion)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        # Transactions are the bulk of any block, so rather than delegating to
+        # CTxIn/CTxOut.buffer_deserialize() the inputs and outputs are parsed
+        # inline, with the common single-byte varints decoded in place.
+        unpack_outpoint = _struct_outpoint.unpack_from
+        unpack_uint32 = _struct_uint32.unpack_from
+        unpack_int64 = _struct_int64.unpack_from
+        CScript = script.CScript
+        buflen = len(buf)
+        start = pos
+        try:
+            nVersion = _struct_int32.unpack_from(buf, pos)[0]
+            pos += 4
+
+            n = buf[pos]
+            if n < 0xfd:
+                pos += 1
+            else:
+                n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+            vin = []
+            for i in range(n):
+                (hash, prevout_n) = unpack_outpoint(buf, pos)
+                pos += 36
+                l = buf[pos]
+                if l < 0xfd:
+                    pos += 1
+                else:
+                    l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                end = pos + l
+                if end > buflen:
+                    raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (l, buflen - pos))
+                scriptSig = CScript(buf[pos:end])
+                nSequence = unpack_uint32(buf, end)[0]
+                pos = end + 4
+                vin.append(CTxIn(COutPoint(hash, prevout_n), scriptSig, nSequence))
+
+            n = buf[pos]
+            if n < 0xfd:
+                pos += 1
+            else:
+                n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+            vout = []
+            for i in range(n):
+                nValue = unpack_int64(buf, pos)[0]
+                pos += 8
+                l = buf[pos]
+                if l < 0xfd:
+                    pos += 1
+                else:
+                    l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                end = pos + l
+                if end > buflen:
+                    raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (l, buflen - pos))
+                vout.append(CTxOut(nValue, CScript(buf[pos:end])))
+                pos = end
+
+            nLockTime = unpack_uint32(buf, pos)[0]
+        except (struct.error, IndexError):
+            raise SerializationTruncationError('Transaction truncated at offset %i' % pos)
+        pos += 4
+
+        tx = cls(vin, vout, nLockTime, nVersion)
+        if cls.GetHash is ImmutableSerializable.GetHash:
+            # Hash the bytes we just parsed rather than re-serializing the
+            # transaction when its txid is first asked for.
+            object.__setattr__(tx, '_cached_GetHash', Hash(buf[start:pos]))
+        return tx, pos
+
+    @staticmethod
+    def buffer_skip(buf, pos=0):
+        """Skip over a serialized transaction without deserializing it
+
+        Returns the offset just past the transaction starting at buf[pos].
+        Only the lengths needed to find the end are decoded.
+        """
+        try:
+            pos += 4
+
+            n = buf[pos]
+            if n < 0xfd:
+                pos += 1
+            else:
+                n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+            for i in range(n):
+                # prevout, scriptSig, nSequence
+                l = buf[pos + 36]
+                if l < 0xfd:
+                    pos += 36 + 1 + l + 4
+                else:
+                    l, pos = VarIntSerializer.buffer_deserialize(buf, pos + 36)
+                    pos += l + 4
+
+            n = buf[pos]
+            if n < 0xfd:
+                pos += 1
+            else:
+                n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+            for i in range(n):
+                # nValue, scriptPubKey
+                l = buf[pos + 8]
+                if l < 0xfd:
+                    pos += 8 + 1 + l
+                else:
+                    l, pos = VarIntSerializer.buffer_deserialize(buf, pos + 8)
+                    pos += l
+        except IndexError:
+            raise SerializationTruncationError('Transaction truncated at offset %i' % pos)
+
+        # nLockTime
+        pos += 4
+        if pos > len(buf):
+            raise SerializationTruncationError('Transaction truncated at offset %i' % len(buf))
+        return pos
+
     def stream_serialize(self, f):
-        f.write(struct.pack(b"<i", self.nVersion))
-        VectorSerializer.stream_serialize(CTxIn, self.vin, f)
-        VectorSerializer.stream_serialize(CTxOut, self.vout, f)
-        f.write(struct.pack(b"<I", self.nLockTime))
+        f.write(_struct_int32.pack(self.nVersion))
+        VectorSerializer.stream_serialize(CTxIn, _shared(self.vin), f)
+        VectorSerializer.stream_serialize(CTxOut, _shared(self.vout), f)
+        f.write(_struct_uint32.pack(self.nLockTime))
+
+    def buffer_serialize(self, buf, pos=0):
+        # As with buffer_deserialize() the inputs and outputs are written
+        # inline, as transactions make up the bulk of a block.
+        pack_prevout = _struct_outpoint_len.pack_into
+        pack_txout = _struct_value_len.pack_into
+        pack_uint32 = _struct_uint32.pack_into
+        varint_serialize = VarIntSerializer.buffer_serialize
+
+        vin = _shared(self.vin)
+        vout = _shared(self.vout)
+
+        _struct_int32.pack_into(buf, pos, self.nVersion)
+        n = len(vin)
+        if n < 0xfd:
+            buf[pos + 4] = n
+            pos += 5
+        else:
+            pos = varint_serialize(n, buf, pos + 4)
+        for txin in vin:
+            prevout = txin.prevout
+            hash = prevout.hash
+            assert len(hash) == 32
+            scriptSig = txin.scriptSig
+            l = len(scriptSig)
+            if l < 0xfd:
+                pack_prevout(buf, pos, hash, prevout.n, l)
+                pos += 37
+            else:
+                pack_prevout(buf, pos, hash, prevout.n, 0)
+                pos = varint_serialize(l, buf, pos + 36)
+            end = pos + l
+            buf[pos:end] = scriptSig
+            pack_uint32(buf, end, txin.nSequence)
+            pos = end + 4
+
+        n = len(vout)
+        if n < 0xfd:
+            buf[pos] = n
+            pos += 1
+        else:
+            pos = varint_serialize(n, buf, pos)
+        for txout in vout:
+            scriptPubKey = txout.scriptPubKey
+            l = len(scriptPubKey)
+            if l < 0xfd:
+                pack_txout(buf, pos, txout.nValue, l)
+                pos += 9
+            else:
+                pack_txout(buf, pos, txout.nValue, 0)
+                pos = varint_serialize(l, buf, pos + 8)
+            end = pos + l
+            buf[pos:end] = scriptPubKey
+            pos = end
+
+        pack_uint32(buf, pos, self.nLockTime)
+        return pos + 4
+
+    def GetSerializeSize(self):
+        varint_size = VarIntSerializer.serialized_size
+        size = 4 + varint_size(len(self.vin)) + varint_size(len(self.vout)) + 4
+        for txin in _shared(self.vin):
+            l = len(txin.scriptSig)
+            size += 36 + varint_size(l) + l + 4
+        for txout in _shared(self.vout):
+            l = len(txout.scriptPubKey)
+            size += 8 + varint_size(l) + l
+        return size
 
     def is_coinbase(self):
         return len(self.vin) == 1 and self.vin[0].prevout.is_null()
@@ -386,9 +788,19 @@ class CMutableTransaction(CTransaction):
 
     @classmethod
     def from_tx(cls, tx):
-        """Create a fully mutable copy of a pre-existing transaction"""
-        vin = [CMutableTxIn.from_txin(txin) for txin in tx.vin]
-        vout = [CMutableTxOut.from_txout(txout) for txout in tx.vout]
+        """Create a fully mutable copy of a pre-existing transaction
+
+        The copy is made on write: immutable inputs and outputs are shared with
+        tx, and reading them through vin or vout gives mutable views of the
+        originals. An input or output is only copied when one of its fields is
+        assigned to. Already mutable inputs and outputs are copied immediately.
+        """
+        vin = _CopyOnWriteList((txin if txin.__class__ is CTxIn else CMutableTxIn.from_txin(txin)
+                                for txin in _shared(tx.vin)),
+                               CTxIn, _CopyOnWriteTxIn)
+        vout = _CopyOnWriteList((txout if txout.__class__ is CTxOut else CMutableTxOut.from_txout(txout)
+                                 for txout in _shared(tx.vout)),
+                                CTxOut, _CopyOnWriteTxOut)
 
         return cls(vin, vout, tx.nLockTime, tx.nVersion)
 
@@ -409,23 +821,27 @@ class CBlockHeader(ImmutableSerializable):
 
     @classmethod
     def stream_deserialize(cls, f):
-        nVersion = struct.unpack(b"<i", ser_read(f,4))[0]
-        hashPrevBlock = ser_read(f,32)
-        hashMerkleRoot = ser_read(f,32)
-        nTime = struct.unpack(b"<I", ser_read(f,4))[0]
-        nBits = struct.unpack(b"<I", ser_read(f,4))[0]
-        nNonce = struct.unpack(b"<I", ser_read(f,4))[0]
-        return cls(nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce)
+        return cls(*_struct_header.unpack(ser_read(f,80)))
+
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        return cls(*ser_unpack_from(_struct_header, buf, pos)), pos + 80
 
     def stream_serialize(self, f):
-        f.write(struct.pack(b"<i", self.nVersion))
         assert len(self.hashPrevBlock) == 32
-        f.write(self.hashPrevBlock)
         assert len(self.hashMerkleRoot) == 32
-        f.write(self.hashMerkleRoot)
-        f.write(struct.pack(b"<I", self.nTime))
-        f.write(struct.pack(b"<I", self.nBits))
-        f.write(struct.pack(b"<I", self.nNonce))
+        f.write(_struct_header.pack(self.nVersion, self.hashPrevBlock, self.hashMerkleRoot,
+                                    self.nTime, self.nBits, self.nNonce))
+
+    def buffer_serialize(self, buf, pos=0):
+        assert len(self.hashPrevBlock) == 32
+        assert len(self.hashMerkleRoot) == 32
+        _struct_header.pack_into(buf, pos, self.nVersion, self.hashPrevBlock, self.hashMerkleRoot,
+                                 self.nTime, self.nBits, self.nNonce)
+        return pos + 80
+
+    def GetSerializeSize(self):
+        return 80
 
     @staticmethod
     def calc_difficulty(nBits):
@@ -497,6 +913,48 @@ class CBlock(CBlockHeader):
             raise ValueError('Block contains no transactions')
         return self.build_merkle_tree_from_txs(self.vtx)[-1]
 
+    def get_merkle_branch(self, index):
+        """Return the merkle branch of the transaction at index
+
+        The branch is the list of hashes, deepest first, that are combined
+        with the txid to reach the merkle root; see
+        calc_merkle_root_from_branch(). It's read from vMerkleTree.
+        """
+        size = len(self.vtx)
+        if index < 0:
+            index += size
+        if not (0 <= index < size):
+            raise IndexError('transaction index out of range')
+
+        vMerkleTree = self.vMerkleTree
+        branch = []
+        j = 0
+        while size > 1:
+            branch.append(vMerkleTree[j + min(index ^ 1, size - 1)])
+            index >>= 1
+            j += size
+            size = (size + 1) // 2
+        return branch
+
+    @staticmethod
+    def calc_merkle_root_from_branch(txid, index, branch):
+        """Calculate the merkle root from a txid and its merkle branch
+
+        index - Position of the transaction in the block
+        branch - Merkle branch, as returned by get_merkle_branch()
+
+        Hashes are in the usual internal byte order; use lx() on the hex
+        strings returned by Electrum servers.
+        """
+        hash = txid
+        for h in branch:
+            if index & 1:
+                hash = Hash(h + hash)
+            else:
+                hash = Hash(hash + h)
+            index >>= 1
+        return hash
+
     def __init__(self, nVersion=2, hashPrevBlock=b'\x00'*32, hashMerkleRoot=b'\x00'*32, nTime=0, nBits=0, nNonce=0, vtx=()):
         """Create a new block"""
         super(CBlock, self).__init__(nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce)
@@ -516,10 +974,33 @@ class CBlock(CBlockHeader):
 
         return self
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        self, pos = super(CBlock, cls).buffer_deserialize(buf, pos)
+
+        vtx, pos = VectorSerializer.buffer_deserialize(CTransaction, buf, pos)
+        vMerkleTree = tuple(CBlock.build_merkle_tree_from_txs(vtx))
+        object.__setattr__(self, 'vMerkleTree', vMerkleTree)
+        object.__setattr__(self, 'vtx', tuple(vtx))
+
+        return self, pos
+
     def stream_serialize(self, f):
         super(CBlock, self).stream_serialize(f)
         VectorSerializer.stream_serialize(CTransaction, self.vtx, f)
 
+    def buffer_serialize(self, buf, pos=0):
+        pos = CBlockHeader.buffer_serialize(self, buf, pos)
+        return VectorSerializer.buffer_serialize(CTransaction, self.vtx, buf, pos)
+
+    # Blocks can be tens of megabytes; don't keep a second copy of them around
+    # in serialized form.
+    serialize = Serializable.serialize
+
+    def GetSerializeSize(self):
+        return (80 + VarIntSerializer.serialized_size(len(self.vtx)) +
+                sum(tx.GetSerializeSize() for tx in self.vtx))
+
     def get_header(self):
         """Return the block header
 
@@ -545,6 +1026,476 @@ class CBlock(CBlockHeader):
             object.__setattr__(self, '_cached_GetHash', _cached_GetHash)
             return _cached_GetHash
 
+class LazyTxVector(collections.abc.Sequence):
+    """The transactions of a LazyCBlock
+
+    A read-only sequence over the serialized transactions of a block. Each
+    transaction is deserialized the first time it is accessed, and then kept.
+    """
+    __slots__ = ['_buf', '_offsets', '_txs']
+
+    def __init__(self, buf, offsets):
+        self._buf = buf
+        self._offsets = offsets
+        self._txs = [None] * (len(offsets) - 1)
+
+    def __len__(self):
+        return len(self._txs)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple(self[j] for j in range(*i.indices(len(self._txs))))
+
+        tx = self._txs[i]
+        if tx is None:
+            if i < 0:
+                i += len(self._txs)
+            tx = CTransaction.buffer_deserialize(self._buf, self._offsets[i])[0]
+            self._txs[i] = tx
+        return tx
+
+    def get_raw(self, i):
+        """Return the serialized transaction i as a memoryview"""
+        if i < 0:
+            i += len(self._txs)
+        if not (0 <= i < len(self._txs)):
+            raise IndexError('transaction index out of range')
+        return self._buf[self._offsets[i]:self._offsets[i+1]]
+
+    def __repr__(self):
+        return 'LazyTxVector(<%d transactions>)' % len(self._txs)
+
+
+class LazyCBlock(CBlock):
+    """A block whose transactions are deserialized on demand
+
+    Deserializing a LazyCBlock only decodes the header and records where each
+    transaction starts. vtx is a LazyTxVector that decodes transactions as they
+    are accessed, and vMerkleTree is only calculated, from the serialized
+    transactions, the first time it is needed.
+
+    The buffer the block was deserialized from is referenced, not copied, so
+    it must not be modified while the block is in use.
+    """
+    __slots__ = ['_vtx_buf', '_vtx', '_vMerkleTree']
+
+    def __init__(self, nVersion=2, hashPrevBlock=b'\x00'*32, hashMerkleRoot=b'\x00'*32, nTime=0, nBits=0, nNonce=0,
+                 vtx_buf=b'\x00', vtx_offsets=None):
+        """Create a new lazy block
+
+        vtx_buf is the serialized vector of transactions. vtx_offsets are the
+        offsets of each transaction in vtx_buf followed by the offset of its
+        end; they're found by scanning vtx_buf if not given.
+        """
+        CBlockHeader.__init__(self, nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce)
+
+        vtx_buf = memoryview(vtx_buf)
+        if vtx_offsets is None:
+            vtx_offsets, pos = self.scan_vtx(vtx_buf)
+            if pos != len(vtx_buf):
+                raise ValueError('LazyCBlock: vtx_buf has %d bytes of extra data' % (len(vtx_buf) - pos))
+        object.__setattr__(self, '_vtx_buf', vtx_buf)
+        object.__setattr__(self, '_vtx', LazyTxVector(vtx_buf, vtx_offsets))
+
+    @staticmethod
+    def scan_vtx(buf, pos=0):
+        """Find the transactions of a serialized vector of transactions
+
+        Returns (offsets, pos), where offsets holds the offset of every
+        transaction followed by the offset of the end of the last one, and pos
+        is the offset just past the vector.
+        """
+        n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+        offsets = array.array('Q', [pos])
+        for i in range(n):
+            pos = CTransaction.buffer_skip(buf, pos)
+            offsets.append(pos)
+        return offsets, pos
+
+    @classmethod
+    def stream_deserialize(cls, f):
+        # A stream can't be scanned without consuming it, so the transactions
+        # are deserialized as usual and re-serialized into vtx_buf.
+        header = CBlockHeader.stream_deserialize(f)
+        vtx = VectorSerializer.stream_deserialize(CTransaction, f)
+        vtx_buf = VarIntSerializer.serialize(len(vtx)) + b''.join(tx.serialize() for tx in vtx)
+        return cls(header.nVersion, header.hashPrevBlock, header.hashMerkleRoot,
+                   header.nTime, header.nBits, header.nNonce, vtx_buf=vtx_buf)
+
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        header, start = CBlockHeader.buffer_deserialize(buf, pos)
+        vtx_buf = buf[start:]
+        vtx_offsets, end = cls.scan_vtx(vtx_buf)
+
+        self = cls(header.nVersion, header.hashPrevBlock, header.hashMerkleRoot,
+                   header.nTime, header.nBits, header.nNonce,
+                   vtx_buf=vtx_buf[:end], vtx_offsets=vtx_offsets)
+        return self, start + end
+
+    def stream_serialize(self, f):
+        CBlockHeader.stream_serialize(self, f)
+        f.write(self._vtx_buf)
+
+    def buffer_serialize(self, buf, pos=0):
+        pos = CBlockHeader.buffer_serialize(self, buf, pos)
+        end = pos + len(self._vtx_buf)
+        buf[pos:end] = self._vtx_buf
+        return end
+
+    def GetSerializeSize(self):
+        return 80 + len(self._vtx_buf)
+
+    vtx = property(lambda self: self._vtx)
+
+    @property
+    def vMerkleTree(self):
+        try:
+            return self._vMerkleTree
+        except AttributeError:
+            vMerkleTree = tuple(CBlock.build_merkle_tree_from_txids(
+                                    [Hash(self._vtx.get_raw(i)) for i in range(len(self._vtx))]))
+            object.__setattr__(self, '_vMerkleTree', vMerkleTree)
+            return vMerkleTree
+
+    def get_txid(self, i):
+        """Return the txid of transaction i without deserializing it"""
+        raw = self._vtx.get_raw(i)
+        try:
+            return self._vMerkleTree[i % len(self._vtx)]
+        except AttributeError:
+            return Hash(raw)
+
+    def calc_merkle_root(self):
+        """Calculate the merkle root
+
+        Calculated from the serialized transactions; as with CBlock the result
+        is not cached.
+        """
+        if not len(self._vtx):
+            raise ValueError('Block contains no transactions')
+        txids = [Hash(self._vtx.get_raw(i)) for i in range(len(self._vtx))]
+        return CBlock.build_merkle_tree_from_txids(txids)[-1]
+
+
+class MerkleTemplate(object):
+    """Merkle tree of a block template, for a coinbase that isn't known yet
+
+    When mining, the coinbase transaction changes with every extranonce while
+    the rest of the block stays the same. MerkleTemplate keeps the tree of
+    the other transactions with the coinbase's position left open, so the
+    merkle root for a given coinbase is calculated from the coinbase branch
+    (the "merkle steps" of the stratum protocol) in log2(n) hashes.
+
+    Transactions can be appended; only the hashes on the path from the new
+    transaction to the root are recalculated.
+    """
+    __slots__ = ['_levels']
+
+    def __init__(self, txids=()):
+        """Create a new merkle template
+
+        txids - txids of the transactions following the coinbase
+        """
+        # The levels of the tree, deepest first. Node 0 of every level depends
+        # on the coinbase, so it's left as None.
+        self._levels = [[None]]
+        self.extend(txids)
+
+    def __len__(self):
+        """Number of transactions, including the coinbase"""
+        return len(self._levels[0])
+
+    def append(self, txid):
+        """Append a transaction"""
+        levels = self._levels
+        levels[0].append(txid)
+
+        i = len(levels[0]) - 1
+        k = 0
+        while len(levels[k]) > 1:
+            # Recalculate the parent of node i, which is either new or was
+            # the hash of its left child with itself.
+            p = i // 2
+            if k + 1 == len(levels):
+                levels.append([None])
+            if p == 0:
+                break
+
+            level = levels[k]
+            left = level[2*p]
+            right = level[2*p + 1] if 2*p + 1 < len(level) else left
+            h = Hash(left + right)
+
+            parent_level = levels[k + 1]
+            if p < len(parent_level):
+                parent_level[p] = h
+            else:
+                parent_level.append(h)
+            i = p
+            k += 1
+
+    def extend(self, txids):
+        """Append transactions"""
+        for txid in txids:
+            self.append(txid)
+
+    @property
+    def merkle_steps(self):
+        """The merkle branch of the coinbase
+
+        As with CBlock.get_merkle_branch(0), deepest first.
+        """
+        return [level[1] for level in self._levels if len(level) > 1]
+
+    def calc_merkle_root(self, coinbase_txid):
+        """Calculate the merkle root with the given coinbase txid"""
+        hash = coinbase_txid
+        for step in self.merkle_steps:
+            hash = Hash(hash + step)
+        return hash
+
+    def __repr__(self):
+        return 'MerkleTemplate(<%d transactions>)' % len(self)
+
+
+class PartialMerkleTreeError(ValidationError):
+    """A partial merkle tree is malformed"""
+
+# Bits of every byte value, least significant first, for unpacking vBits
+_byte_bits = tuple(tuple(bool(b >> i & 1) for i in range(8)) for b in range(256))
+
+class CPartialMerkleTree(ImmutableSerializable):
+    """A merkle tree pruned to the branches of some of the transactions
+
+    Proves that a set of txids is in a block. The tree is traversed depth
+    first; vBits has a bit per node visited, set if the node is a matched
+    transaction or above one, and vHash has the hash of every node visited
+    that isn't descended into: unmatched subtrees and matched transactions.
+
+    Both building and extracting walk the tree with an explicit stack rather
+    than recursion, so big blocks don't hit the recursion limit and don't pay
+    for a Python call per node.
+    """
+    __slots__ = ['nTransactions', 'vBits', 'vHash']
+
+    def __init__(self, nTransactions=0, vBits=(), vHash=()):
+        object.__setattr__(self, 'nTransactions', nTransactions)
+        object.__setattr__(self, 'vBits', tuple(bool(bit) for bit in vBits))
+        object.__setattr__(self, 'vHash', tuple(vHash))
+
+    @classmethod
+    def from_txids(cls, txids, matches):
+        """Build a partial merkle tree
+
+        txids   - txids of all the transactions in the block
+        matches - For every transaction, true if it's to be included
+        """
+        txids = list(txids)
+        matches = [bool(match) for match in matches]
+        if len(txids) != len(matches):
+            raise ValueError('txids and matches must be the same length; got %d and %d' %
+                             (len(txids), len(matches)))
+        if not txids:
+            raise ValueError('Block contains no transactions')
+
+        # The hashes of every level, and whether there is a match below every
+        # node, deepest level first.
+        hashes = [txids]
+        parents = [matches]
+        while len(hashes[-1]) > 1:
+            level = hashes[-1]
+            right = level[1::2]
+            if len(level) & 1:
+                right.append(level[-1])
+            hashes.append([Hash(l + r) for l, r in zip(level[0::2], right)])
+
+            level = parents[-1]
+            parents.append([l or r for l, r in zip(level[0::2], level[1::2] + [False])])
+
+        vBits = []
+        vHash = []
+        stack = [(len(hashes) - 1, 0)]
+        while stack:
+            height, pos = stack.pop()
+            parent_of_match = parents[height][pos]
+            vBits.append(parent_of_match)
+            if height == 0 or not parent_of_match:
+                vHash.append(hashes[height][pos])
+            else:
+                # Left child is popped, and so stored, first
+                if 2*pos + 1 < len(hashes[height - 1]):
+                    stack.append((height - 1, 2*pos + 1))
+                stack.append((height - 1, 2*pos))
+
+        return cls(len(txids), vBits, vHash)
+
+    @classmethod
+    def stream_deserialize(cls, f):
+        nTransactions = _struct_uint32.unpack(ser_read(f, 4))[0]
+        vHash = uint256VectorSerializer.stream_deserialize(f)
+        vBytes = BytesSerializer.stream_deserialize(f)
+        vBits = []
+        for b in bytearray(vBytes):
+            vBits.extend(_byte_bits[b])
+        return cls(nTransactions, vBits, vHash)
+
+    def stream_serialize(self, f):
+        f.write(_struct_uint32.pack(self.nTransactions))
+        uint256VectorSerializer.stream_serialize(self.vHash, f)
+        vBytes = bytearray((len(self.vBits) + 7) // 8)
+        for i, bit in enumerate(self.vBits):
+            if bit:
+                vBytes[i >> 3] |= 1 << (i & 7)
+        BytesSerializer.stream_serialize(bytes(vBytes), f)
+
+    def calc_tree_height(self):
+        """Height of the tree; 0 for a single transaction"""
+        return (self.nTransactions - 1).bit_length()
+
+    def extract_matches(self):
+        """Extract the matched transactions
+
+        Returns (merkle_root, matches), where matches is a list of (index,
+        txid) of the matched transactions, in block order. The caller must
+        check merkle_root against the block header.
+
+        Raises PartialMerkleTreeError if the tree is malformed.
+        """
+        nTransactions = self.nTransactions
+        vBits = self.vBits
+        vHash = self.vHash
+
+        if nTransactions == 0:
+            raise PartialMerkleTreeError('CPartialMerkleTree: no transactions')
+        # A transaction is at least 60 bytes
+        if nTransactions > MAX_BLOCK_SIZE // 60:
+            raise PartialMerkleTreeError('CPartialMerkleTree: too many transactions; got %d' % nTransactions)
+        if len(vHash) > nTransactions:
+            raise PartialMerkleTreeError('CPartialMerkleTree: more hashes than transactions')
+        if len(vBits) < len(vHash):
+            raise PartialMerkleTreeError('CPartialMerkleTree: fewer bits than hashes')
+
+        height = self.calc_tree_height()
+        widths = [(nTransactions + (1 << h) - 1) >> h for h in range(height + 1)]
+
+        matches = []
+        bits_used = hashes_used = 0
+        # Hashes of the subtrees visited, not yet combined into their parent
+        results = []
+        # Nodes to visit as (height, pos); a height of -1 combines the top
+        # one or two results, with pos true if there's a right child.
+        stack = [(height, 0)]
+        try:
+            while stack:
+                h, pos = stack.pop()
+                if h < 0:
+                    if pos:
+                        right = results.pop()
+                        left = results[-1]
+                        if left == right:
+                            # The left and right branches must never be
+                            # identical, see CVE-2012-2459.
+                            raise PartialMerkleTreeError('CPartialMerkleTree: duplicate branches')
+                        results[-1] = Hash(left + right)
+                    else:
+                        results[-1] = Hash(results[-1] + results[-1])
+                    continue
+
+                parent_of_match = vBits[bits_used]
+                bits_used += 1
+                if h == 0 or not parent_of_match:
+                    hash = vHash[hashes_used]
+                    hashes_used += 1
+                    if h == 0 and parent_of_match:
+                        matches.append((pos, hash))
+                    results.append(hash)
+                else:
+                    has_right = 2*pos + 1 < widths[h - 1]
+                    stack.append((-1, has_right))
+                    if has_right:
+                        stack.append((h - 1, 2*pos + 1))
+                    stack.append((h - 1, 2*pos))
+        except IndexError:
+            raise PartialMerkleTreeError('CPartialMerkleTree: ran out of bits or hashes')
+
+        # Every hash must be used, and every bit up to the padding of the
+        # last byte.
+        if (bits_used + 7) // 8 != (len(vBits) + 7) // 8:
+            raise PartialMerkleTreeError('CPartialMerkleTree: not all bits used')
+        if hashes_used != len(vHash):
+            raise PartialMerkleTreeError('CPartialMerkleTree: not all hashes used')
+
+        return results[0], matches
+
+    def __repr__(self):
+        return 'CPartialMerkleTree(%d, %r, %r)' % (self.nTransactions, self.vBits,
+                                                   tuple('lx(%s)' % b2lx(h) for h in self.vHash))
+
+
+class CMerkleBlock(ImmutableSerializable):
+    """A block header and a partial merkle tree of some of its transactions
+
+    The payload of the merkleblock message.
+    """
+    __slots__ = ['header', 'txn', 'vMatchedTxn']
+
+    def __init__(self, header=None, txn=None, vMatchedTxn=()):
+        """Create a new merkle block
+
+        vMatchedTxn is the (index, txid) of the matched transactions; it isn't
+        serialized, use get_matches() on a received merkle block.
+        """
+        object.__setattr__(self, 'header', CBlockHeader() if header is None else header)
+        object.__setattr__(self, 'txn', CPartialMerkleTree() if txn is None else txn)
+        object.__setattr__(self, 'vMatchedTxn', tuple(vMatchedTxn))
+
+    @classmethod
+    def from_block(cls, block, match):
+        """Build a merkle block from a block
+
+        match - Either a container of the txids to include, or a function
+                taking a txid and returning true if it is to be included;
+                e.g. a CBloomFilter's contains method.
+        """
+        if not callable(match):
+            match = match.__contains__
+
+        txids = [tx.GetTxid() for tx in block.vtx]
+        matches = [match(txid) for txid in txids]
+        txn = CPartialMerkleTree.from_txids(txids, matches)
+        return cls(block.get_header(), txn,
+                   [(i, txid) for i, txid in enumerate(txids) if matches[i]])
+
+    @classmethod
+    def stream_deserialize(cls, f):
+        header = CBlockHeader.stream_deserialize(f)
+        txn = CPartialMerkleTree.stream_deserialize(f)
+        return cls(header, txn)
+
+    def stream_serialize(self, f):
+        self.header.stream_serialize(f)
+        self.txn.stream_serialize(f)
+
+    def get_matches(self):
+        """Return the (index, txid) of the matched transactions
+
+        Raises PartialMerkleTreeError if the partial merkle tree is malformed
+        or doesn't match the header's merkle root.
+        """
+        merkle_root, matches = self.txn.extract_matches()
+        if merkle_root != self.header.hashMerkleRoot:
+            raise PartialMerkleTreeError('CMerkleBlock: merkle root mismatch')
+        return matches
+
+    def GetHash(self):
+        """Return the block hash"""
+        return self.header.GetHash()
+
+    def __repr__(self):
+        return 'CMerkleBlock(%r, %r)' % (self.header, self.txn)
+
+
 class CoreChainParams(object):
     """Define consensus-critical parameters of a given instance of the Bitcoin system"""
     MAX_MONEY = None
@@ -606,12 +1557,12 @@ def CheckTransaction(tx):
         raise CheckTransactionError("CheckTransaction() : vout empty")
 
     # Size limits
-    if len(tx.serialize()) > MAX_TX_SIZE:
+    if tx.GetSerializeSize() > MAX_TX_SIZE:
         raise CheckTransactionError("CheckTransaction() : size limits failed")
 
     # Check for negative or overflow output values
     nValueOut = 0
-    for txout in tx.vout:
+    for txout in _shared(tx.vout):
         if txout.nValue < 0:
             raise CheckTransactionError("CheckTransaction() : txout.nValue negative")
         if txout.nValue > coreparams.MAX_MONEY:
@@ -622,7 +1573,7 @@ def CheckTransaction(tx):
 
     # Check for duplicate inputs
     vin_outpoints = set()
-    for txin in tx.vin:
+    for txin in _shared(tx.vin):
         if txin.prevout in vin_outpoints:
             raise CheckTransactionError("CheckTransaction() : duplicate inputs")
         vin_outpoints.add(txin.prevout)
@@ -632,7 +1583,7 @@ def CheckTransaction(tx):
             raise CheckTransactionError("CheckTransaction() : coinbase script size")
 
     else:
-        for txin in tx.vin:
+        for txin in _shared(tx.vin):
             if txin.prevout.is_null():
                 raise CheckTransactionError("CheckTransaction() : prevout is null")
 
@@ -690,14 +1641,14 @@ class CheckBlockError(CheckBlockHeaderError):
 
 def GetLegacySigOpCount(tx):
     nSigOps = 0
-    for txin in tx.vin:
+    for txin in _shared(tx.vin):
         nSigOps += txin.scriptSig.GetSigOpCount(False)
-    for txout in tx.vout:
+    for txout in _shared(tx.vout):
         nSigOps += txout.scriptPubKey.GetSigOpCount(False)
     return nSigOps
 
 
-def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
+def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None, workers=1):
     """Context independent CBlock checks.
 
     Assumes latest consensus rules with regards to block size and sigops count.
@@ -711,12 +1662,18 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
     fCheckMerkleRoot - Check merkle root matches transactions.
 
     cur_time         - Current time. Defaults to time.time()
+
+    workers          - Number of worker processes to build the merkle tree
+                       with; None for the number of CPUs. Only blocks with at
+                       least bitcoincash.parallel.MERKLE_PARALLEL_THRESHOLD
+                       transactions are split between workers, see
+                       bitcoincash.parallel.build_merkle_tree().
     """
 
     # Block header checks
     CheckBlockHeader(block.get_header(), fCheckPoW=fCheckPoW, cur_time=cur_time)
 
-    blocksize = len(block.serialize())
+    blocksize = block.GetSerializeSize()
     # Size limits
     if not block.vtx:
         raise CheckBlockError("CheckBlock() : vtx empty")
@@ -733,6 +1690,7 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
     # For unique txid uniqueness testing. If coinbase tx is included twice
     # it'll be caught by the "more than one coinbase" test.
     unique_txids = set()
+    txids = [block.vtx[0].GetHash()]
     nSigOps = 0
     for tx in block.vtx[1:]:
         if tx.is_coinbase():
@@ -744,24 +1702,68 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
         if txid in unique_txids:
             raise CheckBlockError("CheckBlock() : duplicate transaction")
         unique_txids.add(txid)
+        txids.append(txid)
 
         nSigOps += GetLegacySigOpCount(tx)
         if nSigOps > max_block_sigops(blocksize):
             raise CheckBlockError("CheckBlock() : out-of-bounds SigOpCount")
 
     # Check merkle root
-    if fCheckMerkleRoot and block.hashMerkleRoot != block.calc_merkle_root():
-        raise CheckBlockError("CheckBlock() : hashMerkleRoot mismatch")
+    if fCheckMerkleRoot:
+        if workers == 1:
+            hashMerkleRoot = block.calc_merkle_root()
+        else:
+            import bitcoincash.parallel
+            hashMerkleRoot = bitcoincash.parallel.build_merkle_tree(txids, workers)[-1]
+        if block.hashMerkleRoot != hashMerkleRoot:
+            raise CheckBlockError("CheckBlock() : hashMerkleRoot mismatch")
+
+def verify_merkle_branches(header, proofs):
+    """Verify merkle branches against a block header
+
+    header - CBlockHeader, or the merkle root itself
+    proofs - iterable of (txid, index, branch) tuples
+
+    Returns a list with True for every proof that leads to the header's merkle
+    root. Proofs for transactions of the same block share most of the upper
+    part of their branches, so each distinct pair of hashes is only hashed
+    once over the whole batch.
+    """
+    hashMerkleRoot = getattr(header, 'hashMerkleRoot', header)
+
+    cache = {}
+    results = []
+    for (txid, index, branch) in proofs:
+        if index < 0 or index >> len(branch):
+            # Index points outside a tree of this depth
+            results.append(False)
+            continue
+
+        hash = txid
+        for h in branch:
+            if index & 1:
+                data = h + hash
+            else:
+                data = hash + h
+            index >>= 1
+            try:
+                hash = cache[data]
+            except KeyError:
+                hash = cache[data] = Hash(data)
+        results.append(hash == hashMerkleRoot)
+    return results
 
 __all__ = (
         'CBlock',
         'CBlockHeader',
+        'CMerkleBlock',
         'CMutableOutPoint',
         'CMutableTransaction',
         'CMutableTxIn',
         'CMutableTxOut',
         'COIN',
         'COutPoint',
+        'CPartialMerkleTree',
         'CTransaction',
         'CTxIn',
         'CTxOut',
@@ -780,15 +1782,20 @@ __all__ = (
         'GetLegacySigOpCount',
         'Hash',
         'Hash160',
+        'LazyCBlock',
+        'LazyTxVector',
+        'MerkleTemplate',
         'MAX_BLOCK_SIZE',
         'MAX_TX_SIGOPS_COUNT',
         'MAX_TX_SIZE',
         'MoneyRange',
+        'PartialMerkleTreeError',
         'ValidationError',
         'b2lx',
         'b2x',
         'lx',
         'max_block_sigops',
         'str_money_value',
+        'verify_merkle_branches',
         'x',
 )
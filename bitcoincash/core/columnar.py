@@ -0,0 +1,349 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Columnar storage of the transactions of a block
+
+A deserialized CBlock holds a Python object for every transaction, input,
+output, outpoint and script, which costs hundreds of bytes apiece. TxColumns
+instead keeps the serialized block and records the fields of the inputs and
+outputs in arrays, one per field. Scripts and prevout hashes aren't copied;
+the columns hold their offsets in the serialized block.
+
+Indexing a TxColumns returns a TxView, a lightweight view with the same
+accessors as CTransaction.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import collections.abc
+import struct
+
+from bitcoincash.core import (
+        CBlockHeader,
+        COutPoint,
+        CTransaction,
+        MoneyRange,
+        _struct_int32,
+        _struct_int64,
+        _struct_uint32,
+        )
+from bitcoincash.core.script import CScript
+from bitcoincash.core.serialize import (
+        DeserializationExtraDataError,
+        Hash,
+        SerializationTruncationError,
+        VarIntSerializer,
+        )
+
+
+class TxColumns(collections.abc.Sequence):
+    """The transactions of a block, stored column-wise
+
+    Per transaction:
+
+    tx_offsets        - Offset of every transaction, followed by the end of
+                        the last one
+    tx_nVersion       - nVersion
+    tx_nLockTime      - nLockTime
+    vin_start         - Index of the first input of every transaction in the
+                        input columns, followed by the total number of inputs
+    vout_start        - As vin_start, for outputs
+
+    Per input:
+
+    prevout_offsets   - Offset of the prevout hash
+    prevout_n         - Index of the prevout
+    nSequence         - nSequence
+    scriptSig_offsets - Offset of the scriptSig
+    scriptSig_lengths - Length of the scriptSig
+
+    Per output:
+
+    nValue            - nValue
+    scriptPubKey_offsets - Offset of the scriptPubKey
+    scriptPubKey_lengths - Length of the scriptPubKey
+
+    All offsets are into buf, which must not be modified while the columns are
+    in use.
+    """
+
+    __slots__ = ['buf', 'header', 'end',
+                 'tx_offsets', 'tx_nVersion', 'tx_nLockTime', 'vin_start', 'vout_start',
+                 'prevout_offsets', 'prevout_n', 'nSequence', 'scriptSig_offsets', 'scriptSig_lengths',
+                 'nValue', 'scriptPubKey_offsets', 'scriptPubKey_lengths']
+
+    def __init__(self, buf, pos=0, header=None):
+        """Build the columns from the serialized vector of transactions at buf[pos:]
+
+        Use from_block() for a serialized block.
+        """
+        buf = memoryview(buf)
+        self.buf = buf
+        self.header = header
+
+        self.tx_offsets = array.array('Q')
+        self.tx_nVersion = array.array('i')
+        self.tx_nLockTime = array.array('I')
+        self.vin_start = array.array('Q')
+        self.vout_start = array.array('Q')
+        self.prevout_offsets = array.array('Q')
+        self.prevout_n = array.array('I')
+        self.nSequence = array.array('I')
+        self.scriptSig_offsets = array.array('Q')
+        self.scriptSig_lengths = array.array('I')
+        self.nValue = array.array('q')
+        self.scriptPubKey_offsets = array.array('Q')
+        self.scriptPubKey_lengths = array.array('I')
+
+        self.end = self._parse(buf, pos)
+
+    def _parse(self, buf, pos):
+        unpack_int32 = _struct_int32.unpack_from
+        unpack_uint32 = _struct_uint32.unpack_from
+        unpack_int64 = _struct_int64.unpack_from
+        buflen = len(buf)
+
+        # The arrays are appended to in the loop, so look the methods up once
+        tx_offsets = self.tx_offsets.append
+        tx_nVersion = self.tx_nVersion.append
+        tx_nLockTime = self.tx_nLockTime.append
+        vin_start = self.vin_start.append
+        vout_start = self.vout_start.append
+        prevout_offsets = self.prevout_offsets.append
+        prevout_n = self.prevout_n.append
+        nSequence = self.nSequence.append
+        scriptSig_offsets = self.scriptSig_offsets.append
+        scriptSig_lengths = self.scriptSig_lengths.append
+        nValue = self.nValue.append
+        scriptPubKey_offsets = self.scriptPubKey_offsets.append
+        scriptPubKey_lengths = self.scriptPubKey_lengths.append
+
+        n_vin = n_vout = 0
+        try:
+            n_tx, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+            for i in range(n_tx):
+                tx_offsets(pos)
+                vin_start(n_vin)
+                vout_start(n_vout)
+                tx_nVersion(unpack_int32(buf, pos)[0])
+                pos += 4
+
+                n = buf[pos]
+                if n < 0xfd:
+                    pos += 1
+                else:
+                    n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                n_vin += n
+                for j in range(n):
+                    prevout_offsets(pos)
+                    prevout_n(unpack_uint32(buf, pos + 32)[0])
+                    pos += 36
+                    l = buf[pos]
+                    if l < 0xfd:
+                        pos += 1
+                    else:
+                        l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                    scriptSig_offsets(pos)
+                    scriptSig_lengths(l)
+                    pos += l
+                    nSequence(unpack_uint32(buf, pos)[0])
+                    pos += 4
+
+                n = buf[pos]
+                if n < 0xfd:
+                    pos += 1
+                else:
+                    n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                n_vout += n
+                for j in range(n):
+                    nValue(unpack_int64(buf, pos)[0])
+                    pos += 8
+                    l = buf[pos]
+                    if l < 0xfd:
+                        pos += 1
+                    else:
+                        l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+                    scriptPubKey_offsets(pos)
+                    scriptPubKey_lengths(l)
+                    pos += l
+
+                tx_nLockTime(unpack_uint32(buf, pos)[0])
+                pos += 4
+        except (struct.error, IndexError):
+            raise SerializationTruncationError('Transaction truncated at offset %i' % pos)
+        if pos > buflen:
+            raise SerializationTruncationError('Transaction truncated at offset %i' % buflen)
+
+        tx_offsets(pos)
+        vin_start(n_vin)
+        vout_start(n_vout)
+        return pos
+
+    @classmethod
+    def from_block(cls, buf):
+        """Build the columns from a serialized block
+
+        The block header is deserialized into the header attribute.
+        """
+        buf = memoryview(buf)
+        header, pos = CBlockHeader.buffer_deserialize(buf)
+        self = cls(buf, pos, header)
+        if self.end != len(buf):
+            raise DeserializationExtraDataError('Not all bytes consumed during deserialization',
+                                                self, buf[self.end:].tobytes())
+        return self
+
+    def __len__(self):
+        return len(self.tx_nVersion)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return tuple(TxView(self, j) for j in range(*i.indices(len(self))))
+        if i < 0:
+            i += len(self)
+        if not (0 <= i < len(self)):
+            raise IndexError('transaction index out of range')
+        return TxView(self, i)
+
+    def get_raw(self, i):
+        """Return the serialized transaction i as a memoryview"""
+        return self.buf[self.tx_offsets[i]:self.tx_offsets[i+1]]
+
+    def get_txid(self, i):
+        return Hash(self.get_raw(i))
+
+    def get_prevout(self, j):
+        """Return the prevout of input j as a COutPoint"""
+        start = self.prevout_offsets[j]
+        return COutPoint(self.buf[start:start+32].tobytes(), self.prevout_n[j])
+
+    def get_scriptSig(self, j):
+        """Return the scriptSig of input j"""
+        start = self.scriptSig_offsets[j]
+        return CScript(self.buf[start:start+self.scriptSig_lengths[j]])
+
+    def get_scriptPubKey(self, k):
+        """Return the scriptPubKey of output k"""
+        start = self.scriptPubKey_offsets[k]
+        return CScript(self.buf[start:start+self.scriptPubKey_lengths[k]])
+
+    def __repr__(self):
+        return 'TxColumns(<%d transactions, %d inputs, %d outputs>)' % \
+                    (len(self), len(self.prevout_n), len(self.nValue))
+
+
+class TxView(object):
+    """View of a transaction in a TxColumns
+
+    Has the accessors of a CTransaction; vin and vout are built on access from
+    the columns. Use to_tx() for a real CTransaction.
+    """
+    __slots__ = ['_columns', '_i']
+
+    def __init__(self, columns, i):
+        self._columns = columns
+        self._i = i
+
+    nVersion = property(lambda self: self._columns.tx_nVersion[self._i])
+    nLockTime = property(lambda self: self._columns.tx_nLockTime[self._i])
+
+    @property
+    def vin(self):
+        columns = self._columns
+        return tuple(TxInView(columns, j)
+                     for j in range(columns.vin_start[self._i], columns.vin_start[self._i+1]))
+
+    @property
+    def vout(self):
+        columns = self._columns
+        return tuple(TxOutView(columns, k)
+                     for k in range(columns.vout_start[self._i], columns.vout_start[self._i+1]))
+
+    def is_coinbase(self):
+        columns = self._columns
+        j = columns.vin_start[self._i]
+        return (columns.vin_start[self._i+1] - j == 1 and
+                TxInView(columns, j).prevout.is_null())
+
+    def serialize(self):
+        return self._columns.get_raw(self._i).tobytes()
+
+    def GetTxid(self):
+        return self._columns.get_txid(self._i)
+
+    GetHash = GetTxid
+
+    def to_tx(self):
+        """Deserialize into a CTransaction"""
+        return CTransaction.deserialize(self._columns.get_raw(self._i))
+
+    def __eq__(self, other):
+        if isinstance(other, (TxView, CTransaction)):
+            return self.serialize() == other.serialize()
+        return NotImplemented
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'TxView(%r, %d)' % (self._columns, self._i)
+
+
+class TxInView(object):
+    """View of a transaction input in a TxColumns"""
+    __slots__ = ['_columns', '_j']
+
+    def __init__(self, columns, j):
+        self._columns = columns
+        self._j = j
+
+    prevout = property(lambda self: self._columns.get_prevout(self._j))
+    scriptSig = property(lambda self: self._columns.get_scriptSig(self._j))
+    nSequence = property(lambda self: self._columns.nSequence[self._j])
+
+    def is_final(self):
+        return self.nSequence == 0xffffffff
+
+    def __repr__(self):
+        return "TxInView(%s, %s, 0x%x)" % (repr(self.prevout), repr(self.scriptSig), self.nSequence)
+
+
+class TxOutView(object):
+    """View of a transaction output in a TxColumns"""
+    __slots__ = ['_columns', '_k']
+
+    def __init__(self, columns, k):
+        self._columns = columns
+        self._k = k
+
+    nValue = property(lambda self: self._columns.nValue[self._k])
+    scriptPubKey = property(lambda self: self._columns.get_scriptPubKey(self._k))
+
+    def is_valid(self):
+        if not MoneyRange(self.nValue):
+            return False
+        if not self.scriptPubKey.is_valid():
+            return False
+        return True
+
+    def __repr__(self):
+        return 'TxOutView(%d, %r)' % (self.nValue, self.scriptPubKey)
+
+
+__all__ = (
+        'TxColumns',
+        'TxView',
+        'TxInView',
+        'TxOutView',
+)
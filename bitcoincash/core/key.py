@@ -434,26 +434,39 @@ class CECKey:
 
         return new_sig.raw
 
-    def verify(self, hash, sig): # pylint: disable=redefined-builtin
-        """Verify a DER signature"""
+    @staticmethod
+    def normalize_signature(sig):
+        """Return a DER signature re-serialized, or None if it can't be parsed
+
+        New versions of OpenSSL will reject non-canonical DER signatures, so
+        they're de/re-serialized before being verified.
+        """
         if not sig:
-          return False
+            return None
 
-        # New versions of OpenSSL will reject non-canonical DER signatures. de/re-serialize first.
         norm_sig = ctypes.c_void_p(0)
         _ssl.d2i_ECDSA_SIG(ctypes.byref(norm_sig), ctypes.byref(ctypes.c_char_p(sig)), len(sig))
+        if not norm_sig:
+            return None
 
         derlen = _ssl.i2d_ECDSA_SIG(norm_sig, 0)
         if derlen == 0:
             _ssl.ECDSA_SIG_free(norm_sig)
-            return False
+            return None
 
         norm_der = ctypes.create_string_buffer(derlen)
         _ssl.i2d_ECDSA_SIG(norm_sig, ctypes.byref(ctypes.pointer(norm_der)))
         _ssl.ECDSA_SIG_free(norm_sig)
+        return norm_der.raw
+
+    def verify(self, hash, sig): # pylint: disable=redefined-builtin
+        """Verify a DER signature"""
+        norm_der = self.normalize_signature(sig)
+        if norm_der is None:
+            return False
 
         # -1 = error, 0 = bad sig, 1 = good
-        return _ssl.ECDSA_verify(0, hash, len(hash), norm_der, derlen, self.k) == 1
+        return _ssl.ECDSA_verify(0, hash, len(hash), norm_der, len(norm_der), self.k) == 1
 
     def set_compressed(self, compressed):
         if compressed:
@@ -25,6 +25,8 @@ if sys.version > '3':
     _bchr = lambda x: bytes([x])
     _bord = lambda x: x
 
+import functools
+import hashlib
 import struct
 
 import bitcoincash.core
@@ -503,6 +505,77 @@ class CScriptTruncatedPushDataError(CScriptInvalidError):
         self.data = data
         super(CScriptTruncatedPushDataError, self).__init__(msg)
 
+# Scripts up to this size have their decoding cached by CScript.raw_iter()
+MAX_CACHED_SCRIPT_SIZE = MAX_SCRIPT_ELEMENT_SIZE
+
+# Number of decoded scripts cached
+_DECODED_SCRIPT_CACHE_SIZE = 1 << 15
+
+def _decode_script(script):
+    """Decode a serialized script
+
+    Returns a tuple of the (opcode, data, sop_idx) tuples of the opcodes, and
+    either None or the (exception class, args) of the error ending the script.
+    """
+    ops = []
+    append = ops.append
+    i = 0
+    n = len(script)
+    while i < n:
+        sop_idx = i
+        opcode = script[i]
+        i += 1
+
+        if opcode > OP_PUSHDATA4:
+            append((opcode, None, sop_idx))
+            continue
+
+        if opcode < OP_PUSHDATA1:
+            pushdata_type = 'PUSHDATA(%d)' % opcode
+            datasize = opcode
+
+        elif opcode == OP_PUSHDATA1:
+            pushdata_type = 'PUSHDATA1'
+            if i >= n:
+                return (tuple(ops), (CScriptInvalidError, ('PUSHDATA1: missing data length',)))
+            datasize = script[i]
+            i += 1
+
+        elif opcode == OP_PUSHDATA2:
+            pushdata_type = 'PUSHDATA2'
+            if i + 1 >= n:
+                return (tuple(ops), (CScriptInvalidError, ('PUSHDATA2: missing data length',)))
+            datasize = script[i] + (script[i+1] << 8)
+            i += 2
+
+        else:
+            pushdata_type = 'PUSHDATA4'
+            if i + 3 >= n:
+                return (tuple(ops), (CScriptInvalidError, ('PUSHDATA4: missing data length',)))
+            datasize = script[i] + (script[i+1] << 8) + (script[i+2] << 16) + (script[i+3] << 24)
+            i += 4
+
+        data = bytes(script[i:i+datasize])
+
+        # Check for truncation
+        if len(data) < datasize:
+            return (tuple(ops),
+                    (CScriptTruncatedPushDataError, ('%s: truncated data' % pushdata_type, data)))
+
+        i += datasize
+        append((opcode, data, sop_idx))
+
+    return (tuple(ops), None)
+
+# Keyed by the script itself, which as a bytes subclass hashes and compares as
+# its serialization.
+_decode_script_cached = functools.lru_cache(maxsize=_DECODED_SCRIPT_CACHE_SIZE)(_decode_script)
+
+def _iter_then_raise(ops, err):
+    for op in ops:
+        yield op
+    raise err[0](*err[1])
+
 class CScript(bytes):
     """Serialized script
 
@@ -545,7 +618,7 @@ class CScript(bytes):
         raise NotImplementedError
 
     def __new__(cls, value=b''):
-        if isinstance(value, bytes) or isinstance(value, bytearray):
+        if isinstance(value, (bytes, bytearray, memoryview)):
             return super(CScript, cls).__new__(cls, value)
         else:
             def coerce_iterable(iterable):
@@ -555,62 +628,26 @@ class CScript(bytes):
             # returns a bytes instance even when subclassed.
             return super(CScript, cls).__new__(cls, b''.join(coerce_iterable(value)))
 
+    def _decode(self):
+        if len(self) <= MAX_CACHED_SCRIPT_SIZE:
+            return _decode_script_cached(self)
+        return _decode_script(self)
+
     def raw_iter(self):
         """Raw iteration
 
         Yields tuples of (opcode, data, sop_idx) so that the different possible
         PUSHDATA encodings can be accurately distinguished, as well as
         determining the exact opcode byte indexes. (sop_idx)
-        """
-        i = 0
-        while i < len(self):
-            sop_idx = i
-            opcode = _bord(self[i])
-            i += 1
-
-            if opcode > OP_PUSHDATA4:
-                yield (opcode, None, sop_idx)
-            else:
-                datasize = None
-                pushdata_type = None
-                if opcode < OP_PUSHDATA1:
-                    pushdata_type = 'PUSHDATA(%d)' % opcode
-                    datasize = opcode
-
-                elif opcode == OP_PUSHDATA1:
-                    pushdata_type = 'PUSHDATA1'
-                    if i >= len(self):
-                        raise CScriptInvalidError('PUSHDATA1: missing data length')
-                    datasize = _bord(self[i])
-                    i += 1
-
-                elif opcode == OP_PUSHDATA2:
-                    pushdata_type = 'PUSHDATA2'
-                    if i + 1 >= len(self):
-                        raise CScriptInvalidError('PUSHDATA2: missing data length')
-                    datasize = _bord(self[i]) + (_bord(self[i+1]) << 8)
-                    i += 2
-
-                elif opcode == OP_PUSHDATA4:
-                    pushdata_type = 'PUSHDATA4'
-                    if i + 3 >= len(self):
-                        raise CScriptInvalidError('PUSHDATA4: missing data length')
-                    datasize = _bord(self[i]) + (_bord(self[i+1]) << 8) + (_bord(self[i+2]) << 16) + (_bord(self[i+3]) << 24)
-                    i += 4
-
-                else:
-                    assert False # shouldn't happen
-
-
-                data = bytes(self[i:i+datasize])
 
-                # Check for truncation
-                if len(data) < datasize:
-                    raise CScriptTruncatedPushDataError('%s: truncated data' % pushdata_type, data)
-
-                i += datasize
-
-                yield (opcode, data, sop_idx)
+        The script is decoded once, and the decoding of scripts up to
+        MAX_CACHED_SCRIPT_SIZE bytes is cached, so the scriptPubKeys found
+        over and over again are only parsed the first time.
+        """
+        ops, err = self._decode()
+        if err is None:
+            return iter(ops)
+        return _iter_then_raise(ops, err)
 
     def __iter__(self):
         """'Cooked' iteration
@@ -732,11 +769,7 @@ class CScript(bytes):
         The script is valid if all PUSHDATA's are valid; invalid opcodes do not
         make is_valid() return False.
         """
-        try:
-            list(self)
-        except CScriptInvalidError:
-            return False
-        return True
+        return self._decode()[1] is None
 
     def to_p2sh_scriptPubKey(self, checksize=True):
         """Create P2SH scriptPubKey from this redeemScript
@@ -768,7 +801,7 @@ class CScript(bytes):
                 n += 1
             elif opcode in (OP_CHECKMULTISIG, OP_CHECKMULTISIGVERIFY):
                 if fAccurate and (OP_1 <= lastOpcode <= OP_16):
-                    n += opcode.decode_op_n()
+                    n += CScriptOp(lastOpcode).decode_op_n()
                 else:
                     n += 20
             lastOpcode = opcode
@@ -781,8 +814,18 @@ SIGHASH_SINGLE = 3
 SIGHASH_FORKID = 0x40
 SIGHASH_ANYONECANPAY = 0x80
 
+_NULL_HASH = b'\x00' * 32
+
+# Size of a serialized input with an empty scriptSig
+_LEGACY_INPUT_SIZE = 36 + 1 + 4
+
 def FindAndDelete(script, sig):
     """Consensus critical, see FindAndDelete() in Satoshi codebase"""
+    if sig not in script and script.is_valid():
+        # Nothing to delete. Invalid scripts still go the long way round to
+        # raise the error.
+        return script
+
     r = b''
     last_sop_idx = sop_idx = 0
     skip = True
@@ -850,7 +893,7 @@ def CompareBigEndian(c1, c2):
     return 0
 
 
-def RawSignatureHashLegacy(script, txTo, inIdx, hashtype):
+def RawSignatureHashLegacy(script, txTo, inIdx, hashtype, txdata=None):
     """Consensus-correct SignatureHash
 
     This is the old signature hash algorithm, before the Bitcoin Cash split
@@ -861,53 +904,69 @@ def RawSignatureHashLegacy(script, txTo, inIdx, hashtype):
 
     If you're just writing wallet software you probably want SignatureHash()
     instead.
+
+    txdata - PrecomputedTransactionData for txTo, to share the serialized
+             inputs and outputs between the inputs of the transaction
     """
     HASH_ONE = b'\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 
     if inIdx >= len(txTo.vin):
         return (HASH_ONE, "inIdx %d out of range (%d)" % (inIdx, len(txTo.vin)))
-    txtmp = bitcoincash.core.CMutableTransaction.from_tx(txTo)
-
-    for txin in txtmp.vin:
-        txin.scriptSig = b''
-    txtmp.vin[inIdx].scriptSig = FindAndDelete(script, CScript([OP_CODESEPARATOR]))
-
-    if (hashtype & 0x1f) == SIGHASH_NONE:
-        txtmp.vout = []
-
-        for i in range(len(txtmp.vin)):
-            if i != inIdx:
-                txtmp.vin[i].nSequence = 0
-
-    elif (hashtype & 0x1f) == SIGHASH_SINGLE:
-        outIdx = inIdx
-        if outIdx >= len(txtmp.vout):
-            return (HASH_ONE, "outIdx %d out of range (%d)" % (outIdx, len(txtmp.vout)))
-
-        tmp = txtmp.vout[outIdx]
-        txtmp.vout = []
-        for i in range(outIdx):
-            txtmp.vout.append(bitcoincash.core.CTxOut())
-        txtmp.vout.append(tmp)
-
-        for i in range(len(txtmp.vin)):
-            if i != inIdx:
-                txtmp.vin[i].nSequence = 0
 
+    base_type = hashtype & 0x1f
+    if base_type == SIGHASH_SINGLE and inIdx >= len(txTo.vout):
+        return (HASH_ONE, "outIdx %d out of range (%d)" % (inIdx, len(txTo.vout)))
+
+    if txdata is None:
+        txdata = PrecomputedTransactionData(txTo)
+    elif txdata.tx is not txTo:
+        raise ValueError("txdata was precomputed for a different transaction")
+
+    # The transaction is serialized straight into the hasher, as it would be
+    # with every scriptSig but that of inIdx emptied, instead of modifying a
+    # copy. Every emptied input is _LEGACY_INPUT_SIZE bytes, so the inputs
+    # before and after inIdx are slices of the serialization of all of them,
+    # taken through a memoryview so that they aren't copied.
+    txin = txTo.vin[inIdx]
+    scriptCode = ser_string(FindAndDelete(script, CScript([OP_CODESEPARATOR])))
+    zero_sequences = base_type == SIGHASH_NONE or base_type == SIGHASH_SINGLE
+
+    h = hashlib.sha256(struct.pack(b"<i", txTo.nVersion))
     if hashtype & SIGHASH_ANYONECANPAY:
-        tmp = txtmp.vin[inIdx]
-        txtmp.vin = []
-        txtmp.vin.append(tmp)
-
-    s = txtmp.serialize()
-    s += struct.pack(b"<i", hashtype)
-
-    hash = bitcoincash.core.Hash(s)
-
-    return (hash, None)
-
-
-def SignatureHashLegacy(script, txTo, inIdx, hashtype):
+        h.update(b'\x01')
+        h.update(txin.prevout.serialize())
+        h.update(scriptCode)
+        h.update(struct.pack(b"<I", txin.nSequence))
+    else:
+        if zero_sequences:
+            inputs = memoryview(txdata.legacy_inputs_nosequence)
+        else:
+            inputs = memoryview(txdata.legacy_inputs)
+        pos = inIdx * _LEGACY_INPUT_SIZE
+        h.update(bitcoincash.core.VarIntSerializer.serialize(len(txTo.vin)))
+        h.update(inputs[:pos])
+        h.update(txin.prevout.serialize())
+        h.update(scriptCode)
+        h.update(struct.pack(b"<I", txin.nSequence))
+        h.update(inputs[pos + _LEGACY_INPUT_SIZE:])
+
+    if base_type == SIGHASH_NONE:
+        h.update(b'\x00')
+    elif base_type == SIGHASH_SINGLE:
+        # The outputs before inIdx are replaced with CTxOut(), which is
+        # nValue -1 and an empty scriptPubKey
+        h.update(bitcoincash.core.VarIntSerializer.serialize(inIdx + 1))
+        h.update(b'\xff\xff\xff\xff\xff\xff\xff\xff\x00' * inIdx)
+        h.update(txTo.vout[inIdx].serialize())
+    else:
+        h.update(txdata.legacy_outputs)
+
+    h.update(struct.pack(b"<Ii", txTo.nLockTime, hashtype))
+
+    return (hashlib.sha256(h.digest()).digest(), None)
+
+
+def SignatureHashLegacy(script, txTo, inIdx, hashtype, txdata=None):
     """Calculate a signature hash
 
     This is the old signature hash algorithm, before the Bitcoin Cash split
@@ -917,19 +976,110 @@ def SignatureHashLegacy(script, txTo, inIdx, hashtype):
     consensus-correct behavior, but is what you probably want for general
     wallet use.
     """
-    (h, err) = RawSignatureHashLegacy(script, txTo, inIdx, hashtype)
+    (h, err) = RawSignatureHashLegacy(script, txTo, inIdx, hashtype, txdata)
     if err is not None:
         raise ValueError(err)
     return h
 
+def _hash256(msg):
+    return hashlib.sha256(hashlib.sha256(msg).digest()).digest()
+
+
+class PrecomputedTransactionData(object):
+    """Hashes of a transaction shared by the signature hashes of its inputs
+
+    The signature hash algorithm commits to hashes of all the prevouts, all
+    the nSequences and all the outputs of the transaction. Computing them for
+    every input makes hashing all n inputs O(n^2); pass one
+    PrecomputedTransactionData to SignatureHash() for every input instead.
+
+    The legacy signature hash algorithm serializes the whole transaction with
+    the scriptSigs emptied; the serialized inputs and outputs are kept here to
+    be reused for every input.
+
+    Each of these is computed the first time a signature hash type needing it
+    is used. The transaction must not be modified while the data is in use.
+    """
+    __slots__ = ['tx', '_hashPrevouts', '_hashSequence', '_hashOutputs',
+                 '_legacy_inputs', '_legacy_inputs_nosequence', '_legacy_outputs']
+
+    def __init__(self, txTo):
+        self.tx = txTo
+        self._hashPrevouts = None
+        self._hashSequence = None
+        self._hashOutputs = None
+        self._legacy_inputs = None
+        self._legacy_inputs_nosequence = None
+        self._legacy_outputs = None
+
+    @property
+    def hashPrevouts(self):
+        """Hash of the prevouts of all inputs"""
+        if self._hashPrevouts is None:
+            vin = bitcoincash.core._shared(self.tx.vin)
+            self._hashPrevouts = _hash256(b''.join(txin.prevout.serialize() for txin in vin))
+        return self._hashPrevouts
+
+    @property
+    def hashSequence(self):
+        """Hash of the nSequence of all inputs"""
+        if self._hashSequence is None:
+            vin = bitcoincash.core._shared(self.tx.vin)
+            self._hashSequence = _hash256(struct.pack(b'<%dI' % len(vin),
+                                                      *(txin.nSequence for txin in vin)))
+        return self._hashSequence
+
+    @property
+    def hashOutputs(self):
+        """Hash of all outputs"""
+        if self._hashOutputs is None:
+            vout = bitcoincash.core._shared(self.tx.vout)
+            self._hashOutputs = _hash256(b''.join(txout.serialize() for txout in vout))
+        return self._hashOutputs
+
+    @property
+    def legacy_inputs(self):
+        """The inputs serialized with empty scriptSigs, without the count"""
+        if self._legacy_inputs is None:
+            vin = bitcoincash.core._shared(self.tx.vin)
+            self._legacy_inputs = b''.join(txin.prevout.serialize() + b'\x00' +
+                                           struct.pack(b"<I", txin.nSequence)
+                                           for txin in vin)
+        return self._legacy_inputs
+
+    @property
+    def legacy_inputs_nosequence(self):
+        """As legacy_inputs, with every nSequence 0"""
+        if self._legacy_inputs_nosequence is None:
+            vin = bitcoincash.core._shared(self.tx.vin)
+            self._legacy_inputs_nosequence = b''.join(txin.prevout.serialize() + b'\x00\x00\x00\x00\x00'
+                                                      for txin in vin)
+        return self._legacy_inputs_nosequence
+
+    @property
+    def legacy_outputs(self):
+        """The serialized outputs, with the count"""
+        if self._legacy_outputs is None:
+            vout = bitcoincash.core._shared(self.tx.vout)
+            self._legacy_outputs = b''.join([bitcoincash.core.VarIntSerializer.serialize(len(vout))] +
+                                            [txout.serialize() for txout in vout])
+        return self._legacy_outputs
+
+    def __repr__(self):
+        return 'PrecomputedTransactionData(%r)' % (self.tx,)
+
+
 def SignatureHash(script, txTo, inIdx, hashtype, amount, *,
-        legacy_allow = False, legacy_raw = False):
+        legacy_allow = False, legacy_raw = False, txdata = None):
     """Calculate a signature hash
 
     legacy_allow - Allow hashing using the pre-fork signature hash algorithm
 
     legacy_raw - Don't use the 'Cooked' version that checks if inIdx is out
                  of bounds.
+
+    txdata - PrecomputedTransactionData for txTo, to share between the
+             inputs of the transaction
     """
 
     if not SIGHASH_FORKID & hashtype:
@@ -939,65 +1089,54 @@ def SignatureHash(script, txTo, inIdx, hashtype, amount, *,
                 "If you really want to hash with the old signature hash "
                 "algoritm, set legacy_allow=True")
         elif legacy_raw:
-            (h, _) = RawSignatureHashLegacy(script, txTo, inIdx, hashtype)
+            (h, _) = RawSignatureHashLegacy(script, txTo, inIdx, hashtype, txdata)
             return h
         else:
-            return SignatureHashLegacy(script, txTo, inIdx, hashtype)
+            return SignatureHashLegacy(script, txTo, inIdx, hashtype, txdata)
 
     if amount is None:
         raise ValueError("Cannot hash with new signature hash algorithm when "
                 "amount is None")
 
-    hashPrevouts = 0
-    hashSequence = 0
-    hashOutputs = 0
-
-    def hash256(x):
-        import hashlib
-        sha256 = lambda s: hashlib.new('sha256', s).digest()
-        return sha256(sha256(x))
+    if txdata is None:
+        txdata = PrecomputedTransactionData(txTo)
+    elif txdata.tx is not txTo:
+        raise ValueError("txdata was precomputed for a different transaction")
 
+    hashPrevouts = _NULL_HASH
+    hashSequence = _NULL_HASH
+    hashOutputs = _NULL_HASH
+    base_type = hashtype & 0x1f
 
     if not (hashtype & SIGHASH_ANYONECANPAY):
-        serialize_prevouts = bytes()
-        for i in txTo.vin:
-            serialize_prevouts += i.prevout.serialize()
-        hashPrevouts = uint256_from_str(hash256(serialize_prevouts))
-
-    if (not (hashtype & SIGHASH_ANYONECANPAY) and (hashtype & 0x1f) != SIGHASH_SINGLE and (hashtype & 0x1f) != SIGHASH_NONE):
-        serialize_sequence = bytes()
-        for i in txTo.vin:
-            serialize_sequence += struct.pack("<I", i.nSequence)
-        hashSequence = uint256_from_str(hash256(serialize_sequence))
-
-    if ((hashtype & 0x1f) != SIGHASH_SINGLE and (hashtype & 0x1f) != SIGHASH_NONE):
-        serialize_outputs = bytes()
-        for o in txTo.vout:
-            serialize_outputs += o.serialize()
-        hashOutputs = uint256_from_str(hash256(serialize_outputs))
-    elif ((hashtype & 0x1f) == SIGHASH_SINGLE and inIdx < len(txTo.vout)):
-        serialize_outputs = txTo.vout[inIdx].serialize()
-        hashOutputs = uint256_from_str(hash256(serialize_outputs))
-
-    ss = bytes()
-    ss += struct.pack("<i", txTo.nVersion)
-    ss += uint256_to_str(hashPrevouts)
-    ss += uint256_to_str(hashSequence)
-    ss += txTo.vin[inIdx].prevout.serialize()
-    ss += ser_string(script)
-    ss += struct.pack("<q", amount)
-    ss += struct.pack("<I", txTo.vin[inIdx].nSequence)
-    ss += uint256_to_str(hashOutputs)
-    ss += struct.pack("<I", txTo.nLockTime)
-    ss += struct.pack("<i", hashtype)
-
-    return hash256(ss)
+        hashPrevouts = txdata.hashPrevouts
+
+    if (not (hashtype & SIGHASH_ANYONECANPAY) and base_type != SIGHASH_SINGLE and base_type != SIGHASH_NONE):
+        hashSequence = txdata.hashSequence
+
+    if (base_type != SIGHASH_SINGLE and base_type != SIGHASH_NONE):
+        hashOutputs = txdata.hashOutputs
+    elif (base_type == SIGHASH_SINGLE and inIdx < len(txTo.vout)):
+        hashOutputs = _hash256(txTo.vout[inIdx].serialize())
+
+    txin = txTo.vin[inIdx]
+    ss = b''.join((struct.pack(b"<i", txTo.nVersion),
+                   hashPrevouts,
+                   hashSequence,
+                   txin.prevout.serialize(),
+                   ser_string(script),
+                   struct.pack(b"<qI", amount, txin.nSequence),
+                   hashOutputs,
+                   struct.pack(b"<Ii", txTo.nLockTime, hashtype)))
+
+    return _hash256(ss)
 
 
 __all__ = (
         'MAX_SCRIPT_SIZE',
         'MAX_SCRIPT_ELEMENT_SIZE',
         'MAX_SCRIPT_OPCODES',
+        'MAX_CACHED_SCRIPT_SIZE',
         'OPCODE_NAMES',
         'CScriptOp',
 
@@ -1135,6 +1274,7 @@ __all__ = (
         'FindAndDelete',
         'RawSignatureHashLegacy',
         'SignatureHashLegacy',
+        'PrecomputedTransactionData',
         'SignatureHash',
         'IsLowDERSignature',
 )
@@ -52,7 +52,7 @@ class SerializationError(Exception):
 class SerializationTruncationError(SerializationError):
     """Serialized data was truncated
 
-    Thrown by deserialize() and stream_deserialize()
+    Thrown by deserialize(), stream_deserialize() and buffer_deserialize()
     """
 
 class DeserializationExtraDataError(SerializationError):
@@ -81,6 +81,64 @@ def ser_read(f, n):
         raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (n, len(r)))
     return r
 
+def ser_read_from(buf, pos, n):
+    """Read from a buffer safely
+
+    The buffer counterpart of ser_read(); buf is a memoryview and pos the
+    offset to read from. No data is copied: returns a (memoryview, pos) tuple
+    with the slice read and the offset just past it.
+
+    Raises SerializationError and SerializationTruncationError appropriately.
+    """
+    if n > MAX_SIZE:
+        raise SerializationError('Asked to read 0x%x bytes; MAX_SIZE exceeded' % n)
+    end = pos + n
+    if end > len(buf):
+        raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (n, max(len(buf) - pos, 0)))
+    return buf[pos:end], end
+
+def ser_unpack_from(fmt, buf, pos):
+    """Unpack fixed-size fields from a buffer safely
+
+    Like struct.unpack_from(), but raises SerializationTruncationError if the
+    buffer is too short. fmt may be a format string or a precompiled
+    struct.Struct. The caller is responsible for advancing pos.
+    """
+    if not isinstance(fmt, struct.Struct):
+        fmt = struct.Struct(fmt)
+    try:
+        return fmt.unpack_from(buf, pos)
+    except struct.error:
+        raise SerializationTruncationError('Asked to read %i bytes, but only got %i' %
+                                           (fmt.size, max(len(buf) - pos, 0)))
+
+
+_has_buffer_serialize_cache = {}
+
+def _has_buffer_serialize(cls):
+    """Return True if serialize() can use cls.buffer_serialize()
+
+    That's the case if buffer_serialize() and GetSerializeSize() are both
+    overridden by the class that defines stream_serialize(), or a subclass of
+    it; a subclass that only overrides stream_serialize() must still be
+    serialized with it. The buffer is sized with GetSerializeSize(), whose
+    default implementation calls serialize(), so without an override of it
+    the buffer can't be used either.
+    """
+    try:
+        return _has_buffer_serialize_cache[cls]
+    except KeyError:
+        def defining_class(name):
+            for base in cls.__mro__:
+                if name in base.__dict__:
+                    return base
+        stream_cls = defining_class('stream_serialize')
+        r = all(method_cls is not Serializable and issubclass(method_cls, stream_cls)
+                for method_cls in (defining_class('buffer_serialize'),
+                                   defining_class('GetSerializeSize')))
+        _has_buffer_serialize_cache[cls] = r
+        return r
+
 
 class Serializable(object):
     """Base class for serializable objects"""
@@ -96,28 +154,76 @@ class Serializable(object):
         """Deserialize from a stream"""
         raise NotImplementedError
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        """Deserialize from a memoryview, starting at offset pos
+
+        Returns an (instance, pos) tuple, pos being the offset just past the
+        deserialized data.
+
+        The default implementation wraps the remainder of the buffer in a
+        stream and calls stream_deserialize(). Classes that are deserialized
+        in bulk override this with a cursor-based version that reads fields
+        directly from the buffer.
+        """
+        f = _BytesIO(buf[pos:])
+        r = cls.stream_deserialize(f)
+        return r, pos + f.tell()
+
+    def buffer_serialize(self, buf, pos=0):
+        """Serialize into a writable buffer, starting at offset pos
+
+        buf must have room for GetSerializeSize() bytes at pos. Returns the
+        offset just past the serialized data.
+
+        The default implementation copies in the result of serialize().
+        Classes that are serialized in bulk override this to write fields
+        directly into the buffer, which serialize() then uses.
+        """
+        b = self.serialize()
+        end = pos + len(b)
+        buf[pos:end] = b
+        return end
+
     def serialize(self):
         """Serialize, returning bytes"""
-        f = _BytesIO()
-        self.stream_serialize(f)
-        return f.getvalue()
+        if not _has_buffer_serialize(type(self)):
+            f = _BytesIO()
+            self.stream_serialize(f)
+            return f.getvalue()
+
+        # Write everything into a single buffer of the right size, rather
+        # than through many small stream writes.
+        buf = bytearray(self.GetSerializeSize())
+        pos = self.buffer_serialize(buf, 0)
+        assert pos == len(buf)
+        return bytes(buf)
+
+    def GetSerializeSize(self):
+        """Return the length of the serialized object
+
+        Subclasses calculate this from the lengths of their fields where
+        possible; the default implementation serializes the object.
+        """
+        return len(self.serialize())
 
     @classmethod
     def deserialize(cls, buf, allow_padding=False):
         """Deserialize bytes, returning an instance
 
+        buf may be any object supporting the buffer protocol, such as bytes,
+        bytearray or mmap; it is not copied.
+
         allow_padding - Allow buf to include extra padding. (default False)
 
         If allow_padding is False and not all bytes are consumed during
         deserialization DeserializationExtraDataError will be raised.
         """
-        fd = _BytesIO(buf)
-        r = cls.stream_deserialize(fd)
-        if not allow_padding:
-            padding = fd.read()
-            if len(padding) != 0:
-                raise DeserializationExtraDataError('Not all bytes consumed during deserialization',
-                                                    r, padding)
+        buf = memoryview(buf)
+        r, pos = cls.buffer_deserialize(buf, 0)
+        if not allow_padding and pos != len(buf):
+            raise DeserializationExtraDataError('Not all bytes consumed during deserialization',
+                                                r, buf[pos:].tobytes())
         return r
 
     def GetHash(self):
@@ -137,9 +243,12 @@ class Serializable(object):
         return hash(self.serialize())
 
 class ImmutableSerializable(Serializable):
-    """Immutable serializable object"""
+    """Immutable serializable object
+
+    As the object can't change, serialize(), GetHash() and hash() are cached.
+    """
 
-    __slots__ = ['_cached_GetHash', '_cached__hash__']
+    __slots__ = ['_cached_serialize', '_cached_GetHash', '_cached__hash__']
 
     def __setattr__(self, name, value):
         raise AttributeError('Object is immutable')
@@ -147,6 +256,15 @@ class ImmutableSerializable(Serializable):
     def __delattr__(self, name):
         raise AttributeError('Object is immutable')
 
+    def serialize(self):
+        """Serialize, returning bytes"""
+        try:
+            return self._cached_serialize
+        except AttributeError:
+            _cached_serialize = super(ImmutableSerializable, self).serialize()
+            object.__setattr__(self, '_cached_serialize', _cached_serialize)
+            return _cached_serialize
+
     def GetHash(self):
         """Return the hash of the serialized object"""
         try:
@@ -177,6 +295,21 @@ class Serializer(object):
     def stream_deserialize(cls, f):
         raise NotImplementedError
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        """Deserialize from a memoryview at offset pos, returning (obj, pos)"""
+        f = _BytesIO(buf[pos:])
+        r = cls.stream_deserialize(f)
+        return r, pos + f.tell()
+
+    @classmethod
+    def buffer_serialize(cls, obj, buf, pos=0):
+        """Serialize obj into a writable buffer at offset pos, returning the new pos"""
+        b = cls.serialize(obj)
+        end = pos + len(b)
+        buf[pos:end] = b
+        return end
+
     @classmethod
     def serialize(cls, obj):
         f = _BytesIO()
@@ -190,8 +323,29 @@ class Serializer(object):
         return cls.stream_deserialize(buf)
 
 
+# Precompiled codecs for the varint values following the 0xfd, 0xfe and 0xff
+# prefixes, without and with the prefix itself.
+_struct_uint16 = struct.Struct(b'<H')
+_struct_uint32 = struct.Struct(b'<I')
+_struct_uint64 = struct.Struct(b'<Q')
+_struct_prefixed_uint16 = struct.Struct(b'<BH')
+_struct_prefixed_uint32 = struct.Struct(b'<BI')
+_struct_prefixed_uint64 = struct.Struct(b'<BQ')
+
 class VarIntSerializer(Serializer):
     """Serialization of variable length ints"""
+    @staticmethod
+    def serialized_size(i):
+        """Return the length of the serialized varint i"""
+        if i < 0xfd:
+            return 1
+        elif i <= 0xffff:
+            return 3
+        elif i <= 0xffffffff:
+            return 5
+        else:
+            return 9
+
     @classmethod
     def stream_serialize(cls, i, f):
         if i < 0:
@@ -199,14 +353,28 @@ class VarIntSerializer(Serializer):
         elif i < 0xfd:
             f.write(_bchr(i))
         elif i <= 0xffff:
-            f.write(_bchr(0xfd))
-            f.write(struct.pack(b'<H', i))
+            f.write(_struct_prefixed_uint16.pack(0xfd, i))
+        elif i <= 0xffffffff:
+            f.write(_struct_prefixed_uint32.pack(0xfe, i))
+        else:
+            f.write(_struct_prefixed_uint64.pack(0xff, i))
+
+    @classmethod
+    def buffer_serialize(cls, i, buf, pos=0):
+        if i < 0:
+            raise ValueError('varint must be non-negative integer')
+        elif i < 0xfd:
+            buf[pos] = i
+            return pos + 1
+        elif i <= 0xffff:
+            _struct_prefixed_uint16.pack_into(buf, pos, 0xfd, i)
+            return pos + 3
         elif i <= 0xffffffff:
-            f.write(_bchr(0xfe))
-            f.write(struct.pack(b'<I', i))
+            _struct_prefixed_uint32.pack_into(buf, pos, 0xfe, i)
+            return pos + 5
         else:
-            f.write(_bchr(0xff))
-            f.write(struct.pack(b'<Q', i))
+            _struct_prefixed_uint64.pack_into(buf, pos, 0xff, i)
+            return pos + 9
 
     @classmethod
     def stream_deserialize(cls, f):
@@ -214,11 +382,25 @@ class VarIntSerializer(Serializer):
         if r < 0xfd:
             return r
         elif r == 0xfd:
-            return struct.unpack(b'<H', ser_read(f, 2))[0]
+            return _struct_uint16.unpack(ser_read(f, 2))[0]
         elif r == 0xfe:
-            return struct.unpack(b'<I', ser_read(f, 4))[0]
+            return _struct_uint32.unpack(ser_read(f, 4))[0]
         else:
-            return struct.unpack(b'<Q', ser_read(f, 8))[0]
+            return _struct_uint64.unpack(ser_read(f, 8))[0]
+
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        if pos >= len(buf):
+            raise SerializationTruncationError('Asked to read 1 bytes, but only got 0')
+        r = buf[pos]
+        if r < 0xfd:
+            return r, pos + 1
+        elif r == 0xfd:
+            return ser_unpack_from(_struct_uint16, buf, pos + 1)[0], pos + 3
+        elif r == 0xfe:
+            return ser_unpack_from(_struct_uint32, buf, pos + 1)[0], pos + 5
+        else:
+            return ser_unpack_from(_struct_uint64, buf, pos + 1)[0], pos + 9
 
 
 class BytesSerializer(Serializer):
@@ -228,11 +410,24 @@ class BytesSerializer(Serializer):
         VarIntSerializer.stream_serialize(len(b), f)
         f.write(b)
 
+    @classmethod
+    def buffer_serialize(cls, b, buf, pos=0):
+        pos = VarIntSerializer.buffer_serialize(len(b), buf, pos)
+        end = pos + len(b)
+        buf[pos:end] = b
+        return end
+
     @classmethod
     def stream_deserialize(cls, f):
         l = VarIntSerializer.stream_deserialize(f)
         return ser_read(f, l)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        l, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+        r, pos = ser_read_from(buf, pos, l)
+        return r.tobytes(), pos
+
 
 class VectorSerializer(Serializer):
     """Base class for serializers of object vectors"""
@@ -247,6 +442,13 @@ class VectorSerializer(Serializer):
         for obj in objs:
             inner_cls.stream_serialize(obj, f)
 
+    @classmethod
+    def buffer_serialize(cls, inner_cls, objs, buf, pos=0):
+        pos = VarIntSerializer.buffer_serialize(len(objs), buf, pos)
+        for obj in objs:
+            pos = inner_cls.buffer_serialize(obj, buf, pos)
+        return pos
+
     @classmethod
     def stream_deserialize(cls, inner_cls, f):
         n = VarIntSerializer.stream_deserialize(f)
@@ -255,6 +457,15 @@ class VectorSerializer(Serializer):
             r.append(inner_cls.stream_deserialize(f))
         return r
 
+    @classmethod
+    def buffer_deserialize(cls, inner_cls, buf, pos=0):
+        n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+        r = []
+        for i in range(n):
+            obj, pos = inner_cls.buffer_deserialize(buf, pos)
+            r.append(obj)
+        return r, pos
+
 
 class uint256VectorSerializer(Serializer):
     """Serialize vectors of uint256"""
@@ -273,6 +484,15 @@ class uint256VectorSerializer(Serializer):
             r.append(ser_read(f, 32))
         return r
 
+    @classmethod
+    def buffer_deserialize(cls, buf, pos=0):
+        n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+        r = []
+        for i in range(n):
+            uint, pos = ser_read_from(buf, pos, 32)
+            r.append(uint.tobytes())
+        return r, pos
+
 
 class intVectorSerializer(Serializer):
 
@@ -393,6 +613,8 @@ __all__ = (
         'SerializationTruncationError',
         'DeserializationExtraDataError',
         'ser_read',
+        'ser_read_from',
+        'ser_unpack_from',
         'Serializable',
         'ImmutableSerializable',
         'Serializer',
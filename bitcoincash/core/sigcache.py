@@ -0,0 +1,173 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Caches of valid signatures and scripts
+
+A transaction is usually verified twice: when it's accepted to the mempool
+and again when it's mined. As full nodes do, the signature checks made by
+script evaluation remember the (sighash, pubkey, signature) triples found to
+be valid, so the second time no elliptic curve operations are needed.
+VerifyTransactionScripts() goes further and remembers the transactions whose
+scripts all passed with a given set of flags, skipping script evaluation
+altogether.
+
+The caches are process-wide; set signature_cache or script_cache to None to
+disable them, or replace them with caches of a different size.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import hashlib
+import os
+import struct
+import threading
+
+
+DEFAULT_MAX_SIGCACHE_SIZE = 32 * 1024 * 1024
+DEFAULT_MAX_SCRIPTCACHE_SIZE = 16 * 1024 * 1024
+
+
+class _BoundedCache(object):
+    """Bounded set of keys, evicting the least recently used"""
+
+    # Approximate memory used per entry: the key and its slot in the ordered
+    # dict.
+    ENTRY_SIZE = 160
+
+    def __init__(self, max_bytes):
+        self.max_entries = max(1, max_bytes // self.ENTRY_SIZE)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _contains(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def _add(self, key):
+        with self._lock:
+            entries = self._entries
+            entries[key] = None
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return a dict of the entries, hits, misses and evictions"""
+        return {'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    def __repr__(self):
+        return '%s(<%d/%d entries, %d hits, %d misses>)' % \
+                    (self.__class__.__name__, len(self._entries), self.max_entries,
+                     self.hits, self.misses)
+
+
+class SignatureCache(_BoundedCache):
+    """Bounded cache of valid signatures, evicting the least recently used
+
+    Entries are keyed by a salted hash of the triple, so the cache contents
+    can't be predicted by someone trying to make entries collide, and every
+    entry costs the same memory however big the signature and pubkey are.
+
+    Only valid signatures are added; a miss means the signature must be
+    verified, not that it's invalid. Callers must check that the pubkey and
+    signature can be parsed before looking them up, as a hit skips that.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_SIGCACHE_SIZE):
+        """Create a new signature cache using about max_bytes of memory"""
+        super(SignatureCache, self).__init__(max_bytes)
+        self._salt = os.urandom(32)
+
+    def _key(self, sighash, pubkey, sig):
+        # Every field is length-prefixed, so the same bytes split differently
+        # between the pubkey and signature make a different key.
+        h = hashlib.sha256(self._salt)
+        for field in (sighash, pubkey, sig):
+            h.update(struct.pack(b'<I', len(field)))
+            h.update(field)
+        return h.digest()
+
+    def contains(self, sighash, pubkey, sig):
+        """Return True if the signature is known to be valid"""
+        return self._contains(self._key(sighash, pubkey, sig))
+
+    def add(self, sighash, pubkey, sig):
+        """Add a valid signature"""
+        self._add(self._key(sighash, pubkey, sig))
+
+
+class ScriptCache(_BoundedCache):
+    """Bounded cache of transactions whose scripts are valid
+
+    Entries are keyed by a salted hash of the txid and the outputs spent,
+    along with the script verification flags, a ScriptVerifyFlags bitmask. A
+    node knows the outputs a transaction spends from its own UTXO set; here
+    they're supplied by the caller, so they're part of the key to stop a check
+    against the wrong outputs from vouching for the right ones.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_SCRIPTCACHE_SIZE):
+        """Create a new script cache using about max_bytes of memory"""
+        super(ScriptCache, self).__init__(max_bytes)
+        self._salt = os.urandom(32)
+
+    def _key(self, txid, spent_outputs, flags):
+        h = hashlib.sha256(self._salt)
+        h.update(txid)
+        for txout in spent_outputs:
+            h.update(txout.serialize())
+        return (h.digest(), int(flags))
+
+    def contains(self, txid, spent_outputs, flags):
+        """Return True if the transaction's scripts are known to be valid"""
+        return self._contains(self._key(txid, spent_outputs, flags))
+
+    def add(self, txid, spent_outputs, flags):
+        """Add a transaction whose scripts are valid with flags"""
+        self._add(self._key(txid, spent_outputs, flags))
+
+
+signature_cache = SignatureCache()
+script_cache = ScriptCache()
+
+
+__all__ = (
+        'DEFAULT_MAX_SCRIPTCACHE_SIZE',
+        'DEFAULT_MAX_SIGCACHE_SIZE',
+        'ScriptCache',
+        'SignatureCache',
+        'script_cache',
+        'signature_cache',
+)
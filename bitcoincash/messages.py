@@ -51,22 +51,24 @@ class MsgSerializable(Serializable):
     def msg_deser(cls, f, protover=PROTO_VERSION):
         raise NotImplementedError
 
-    def to_bytes(self):
+    def msg_body(self):
+        """Return the serialized message body"""
         f = _BytesIO()
         self.msg_ser(f)
-        body = f.getvalue()
-        res = bitcoincash.params.NETWORK_MAGIC
-        res += self.command
-        res += b"\x00" * (12 - len(self.command))
-        res += struct.pack(b"<I", len(body))
+        return f.getvalue()
+
+    def to_bytes(self):
+        body = self.msg_body()
 
         # add checksum
         th = hashlib.sha256(body).digest()
         h = hashlib.sha256(th).digest()
-        res += h[:4]
 
-        res += body
-        return res
+        # command is padded with zeros to 12 bytes; the body is only copied
+        # once, into the result
+        return b"".join((bitcoincash.params.NETWORK_MAGIC,
+                         struct.pack(b"<12sI4s", self.command, len(body), h[:4]),
+                         body))
 
     @classmethod
     def from_bytes(cls, b, protover=PROTO_VERSION):
@@ -368,6 +370,9 @@ class msg_tx(MsgSerializable):
     def msg_ser(self, f):
         self.tx.stream_serialize(f)
 
+    def msg_body(self):
+        return self.tx.serialize()
+
     def __repr__(self):
         return "msg_tx(tx=%s)" % (repr(self.tx))
 
@@ -388,10 +393,33 @@ class msg_block(MsgSerializable):
     def msg_ser(self, f):
         self.block.stream_serialize(f)
 
+    def msg_body(self):
+        return self.block.serialize()
+
     def __repr__(self):
         return "msg_block(block=%s)" % (repr(self.block))
 
 
+class msg_merkleblock(MsgSerializable):
+    command = b"merkleblock"
+
+    def __init__(self, protover=PROTO_VERSION):
+        super(msg_merkleblock, self).__init__(protover)
+        self.merkleblock = CMerkleBlock()
+
+    @classmethod
+    def msg_deser(cls, f, protover=PROTO_VERSION):
+        c = cls()
+        c.merkleblock = CMerkleBlock.stream_deserialize(f)
+        return c
+
+    def msg_ser(self, f):
+        self.merkleblock.stream_serialize(f)
+
+    def __repr__(self):
+        return "msg_merkleblock(merkleblock=%s)" % (repr(self.merkleblock))
+
+
 class msg_getaddr(MsgSerializable):
     command = b"getaddr"
 
@@ -493,8 +521,8 @@ class msg_mempool(MsgSerializable):
 
 msg_classes = [msg_version, msg_verack, msg_addr, msg_alert, msg_inv,
                msg_getdata, msg_notfound, msg_getblocks, msg_getheaders,
-               msg_headers, msg_tx, msg_block, msg_getaddr, msg_ping,
-               msg_pong, msg_reject, msg_mempool]
+               msg_headers, msg_tx, msg_block, msg_merkleblock, msg_getaddr,
+               msg_ping, msg_pong, msg_reject, msg_mempool]
 
 messagemap = {}
 for cls in msg_classes:
@@ -517,6 +545,7 @@ __all__ = (
         'msg_headers',
         'msg_tx',
         'msg_block',
+        'msg_merkleblock',
         'msg_getaddr',
         'msg_ping',
         'msg_pong',
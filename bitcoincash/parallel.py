@@ -0,0 +1,260 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Decoding of blocks and transactions in worker processes
+
+Deserialization is pure Python, so it's limited to a single core by the GIL.
+decode_blocks() and decode_transactions() spread the work over a pool of
+processes. Rather than pickling whole blocks back to the caller, the workers
+return compact summaries: txids, where each transaction is in the block, and
+the outputs created.
+
+build_merkle_tree() does the same for the merkle tree of very large blocks,
+as does CheckBlock() when given workers, and map_ordered() for any other
+picklable function.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import collections
+import concurrent.futures
+import hashlib
+import os
+
+import bitcoincash
+from bitcoincash.core import (
+        CBlock,
+        CBlockHeader,
+        CheckBlock,
+        CheckTransaction,
+        CTransaction,
+        LazyCBlock,
+        )
+from bitcoincash.core.serialize import VarIntSerializer
+
+
+class DecodedBlock(collections.namedtuple('DecodedBlock',
+                        ['raw_header', 'hash', 'tx_offsets', 'txids', 'outputs'])):
+    """Summary of a block returned by decode_blocks()
+
+    raw_header: The serialized 80 byte header
+    hash: The block hash
+    tx_offsets: array of the offset of every transaction in the serialized
+                block, followed by the length of the block
+    txids: Tuple of the txids of the transactions
+    outputs: Tuple with, for every transaction, a tuple of (nValue,
+             scriptPubKey) of its outputs; None if outputs weren't requested
+    """
+    __slots__ = ()
+
+    @property
+    def header(self):
+        return CBlockHeader.deserialize(self.raw_header)
+
+
+class DecodedTransaction(collections.namedtuple('DecodedTransaction', ['txid', 'outputs'])):
+    """Summary of a transaction returned by decode_transactions()
+
+    txid: The txid
+    outputs: Tuple of (nValue, scriptPubKey) of the outputs; None if outputs
+             weren't requested
+    """
+    __slots__ = ()
+
+
+def _summarize_outputs(tx):
+    return tuple((txout.nValue, bytes(txout.scriptPubKey)) for txout in tx.vout)
+
+
+def _decode_block(raw_block, outputs=True, check=False):
+    block = LazyCBlock.deserialize(raw_block)
+    if check:
+        CheckBlock(block)
+
+    vtx = block.vtx
+    tx_offsets = array.array('Q')
+    pos = 80 + VarIntSerializer.serialized_size(len(vtx))
+    for i in range(len(vtx)):
+        tx_offsets.append(pos)
+        pos += len(vtx.get_raw(i))
+    tx_offsets.append(pos)
+
+    return DecodedBlock(bytes(raw_block[:80]),
+                        block.GetHash(),
+                        tx_offsets,
+                        tuple(block.get_txid(i) for i in range(len(vtx))),
+                        tuple(_summarize_outputs(tx) for tx in vtx) if outputs else None)
+
+
+def _decode_transaction(raw_tx, outputs=True, check=False):
+    tx = CTransaction.deserialize(raw_tx)
+    if check:
+        CheckTransaction(tx)
+    return DecodedTransaction(tx.GetTxid(),
+                              _summarize_outputs(tx) if outputs else None)
+
+
+def _init_worker(params_name):
+    # Workers that aren't forked, as with the spawn and forkserver start
+    # methods, import the library afresh and would check blocks against the
+    # mainnet parameters.
+    bitcoincash.SelectParams(params_name)
+
+
+def _process_pool(workers):
+    """Start a pool of worker processes using the chain parameters selected here"""
+    return concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                  initargs=(bitcoincash.params.NAME,))
+
+
+def map_ordered(fn, items, workers=None, args=()):
+    """Apply fn(item, *args) to every item using worker processes
+
+    fn, the items, args and the results must be picklable.
+
+    workers - Number of worker processes; defaults to the number of CPUs.
+              With 1 or less the items are processed in this process.
+
+    Yields the results in the same order as items. An exception raised by fn
+    is raised when its result is reached.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for item in items:
+            yield fn(item, *args)
+        return
+
+    with _process_pool(workers) as executor:
+        # Executor.map() submits the whole iterable up front, so the number of
+        # items in flight is bounded here instead to keep memory use flat.
+        max_pending = workers * 4
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(fn, item, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def decode_blocks(raw_blocks, workers=None, outputs=True, check=False):
+    """Decode serialized blocks in parallel
+
+    raw_blocks - Iterable of serialized blocks, as bytes
+    workers    - Number of worker processes; defaults to the number of CPUs.
+                 With 1 or less the blocks are decoded in this process.
+    outputs    - Include the outputs of every transaction
+    check      - Run CheckBlock() on every block, with the chain parameters
+                 selected by SelectParams() in this process
+
+    Yields a DecodedBlock for each block, in the same order as raw_blocks.
+    Errors decoding or checking a block are raised when its result is reached.
+    """
+    return map_ordered(_decode_block, raw_blocks, workers, (outputs, check))
+
+
+def decode_transactions(raw_txs, workers=None, outputs=True, check=False):
+    """Decode serialized transactions in parallel
+
+    As decode_blocks(), yielding a DecodedTransaction for each transaction.
+    Transactions are small, so batch them into blocks instead where possible.
+    """
+    return map_ordered(_decode_transaction, raw_txs, workers, (outputs, check))
+
+
+# Below this many txids the cost of starting and feeding the workers is more
+# than the hashing saved.
+MERKLE_PARALLEL_THRESHOLD = 1 << 17
+
+# Number of txids hashed by a worker per task; a power of two, so that every
+# chunk is a complete subtree of the merkle tree.
+MERKLE_CHUNK_SIZE = 1 << 14
+
+
+def _merkle_subtree(txids, height):
+    """Return the levels, bottom up, above txids in a subtree of height
+
+    A subtree with less than 2**height txids is at the end of the tree, so the
+    last node of an odd level is paired with itself, as for the whole tree.
+    """
+    sha256 = hashlib.sha256
+    levels = []
+    level = txids
+    for i in range(height):
+        right = level[1::2]
+        if len(level) & 1:
+            right.append(level[-1])
+        level = [sha256(sha256(l + r).digest()).digest()
+                 for l, r in zip(level[0::2], right)]
+        levels.append(level)
+    return levels
+
+
+def build_merkle_tree(txids, workers=None, executor=None):
+    """Build the merkle tree of a list of txids using worker processes
+
+    Returns the same list as CBlock.build_merkle_tree_from_txids(); see its
+    warning about CVE-2012-2459.
+
+    workers  - Number of worker processes; defaults to the number of CPUs
+    executor - An existing concurrent.futures executor to use instead of
+               starting a pool of workers
+
+    Hashing is done by the hashlib C code, but for 64 byte messages it doesn't
+    release the GIL, so threads don't help; processes do. The txids are split
+    into chunks of MERKLE_CHUNK_SIZE, each a complete subtree hashed by one
+    worker, and the few levels above the chunks are hashed here. Lists with
+    less than MERKLE_PARALLEL_THRESHOLD txids, or with no more than one
+    worker, are built in this process.
+    """
+    txids = list(txids)
+    if executor is None:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or len(txids) < MERKLE_PARALLEL_THRESHOLD:
+            return CBlock.build_merkle_tree_from_txids(txids)
+
+    chunk_height = MERKLE_CHUNK_SIZE.bit_length() - 1
+    chunks = [txids[i:i+MERKLE_CHUNK_SIZE] for i in range(0, len(txids), MERKLE_CHUNK_SIZE)]
+    if len(chunks) == 1:
+        # Not enough txids to split the work
+        return CBlock.build_merkle_tree_from_txids(txids)
+
+    if executor is None:
+        with _process_pool(workers) as executor:
+            subtrees = list(executor.map(_merkle_subtree, chunks, [chunk_height] * len(chunks)))
+    else:
+        subtrees = list(executor.map(_merkle_subtree, chunks, [chunk_height] * len(chunks)))
+
+    # Level i of the tree is level i of every subtree, in order
+    merkle_tree = txids
+    for i in range(chunk_height):
+        for levels in subtrees:
+            merkle_tree.extend(levels[i])
+
+    # ...and the levels above the subtrees
+    roots = [levels[-1][0] for levels in subtrees]
+    for level in _merkle_subtree(roots, (len(roots) - 1).bit_length()):
+        merkle_tree.extend(level)
+    return merkle_tree
+
+
+__all__ = (
+        'DecodedBlock',
+        'DecodedTransaction',
+        'decode_blocks',
+        'decode_transactions',
+        'map_ordered',
+        'build_merkle_tree',
+        'MERKLE_PARALLEL_THRESHOLD',
+)
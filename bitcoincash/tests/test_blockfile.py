@@ -0,0 +1,85 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import bitcoincash
+from bitcoincash.blockfile import *
+from bitcoincash.tests.test_checkblock import load_test_vectors
+
+def frame(block_bytes):
+    return bitcoincash.params.DB_MAGIC + struct.pack(b'<I', len(block_bytes)) + block_bytes
+
+class Test_BlockFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.blocks = []
+        for (comment, fHeader, fCheckPoW, cur_time, blk) in load_test_vectors('checkblock_valid.json'):
+            if not fHeader and blk.GetHash() not in [b.GetHash() for b in self.blocks]:
+                self.blocks.append(blk)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as fd:
+            fd.write(data)
+        return path
+
+    def test_iter_blocks(self):
+        # Junk between frames is skipped and preallocated zeros end the file
+        data = b''.join(frame(blk.serialize()) + b'junk' for blk in self.blocks)
+        path = self.write_file('blk00000.dat', data + b'\x00' * 64)
+
+        with BlockFile(path) as blockfile:
+            found = list(blockfile)
+            self.assertEqual(len(found), len(self.blocks))
+            for (offset, header, block), blk in zip(found, self.blocks):
+                self.assertEqual(header.GetHash(), blk.GetHash())
+                self.assertEqual(block.serialize(), blk.serialize())
+                self.assertEqual(blockfile.read_block(offset).GetHash(), blk.GetHash())
+
+    def test_empty(self):
+        path = self.write_file('blk00000.dat', b'')
+        self.assertEqual(list(iter_blocks(path)), [])
+
+    def test_truncated(self):
+        path = self.write_file('blk00000.dat', frame(self.blocks[0].serialize())[:-1])
+        with self.assertRaises(BlockFileError):
+            list(iter_blocks(path))
+
+    def test_index(self):
+        paths = [self.write_file('blk%05d.dat' % i, frame(blk.serialize()))
+                 for i, blk in enumerate(self.blocks)]
+
+        index = BlockIndex()
+        for path in paths:
+            index.add_file(path)
+        self.assertEqual(len(index), len(self.blocks))
+
+        index_path = os.path.join(self.tmpdir, 'index.dat')
+        index.save(index_path)
+        index2 = BlockIndex.load(index_path)
+
+        for path, blk in zip(paths, self.blocks):
+            self.assertIn(blk.GetHash(), index2)
+            self.assertEqual(index2.lookup(blk.GetHash()), (path, 8))
+            self.assertEqual(index2.read_block(blk.GetHash()).serialize(), blk.serialize())
+
+        with self.assertRaises(KeyError):
+            index2.lookup(b'\x00' * 32)
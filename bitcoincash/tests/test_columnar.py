@@ -0,0 +1,61 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from bitcoincash.core import *
+from bitcoincash.core.columnar import *
+from bitcoincash.core.serialize import SerializationTruncationError
+from bitcoincash.tests.test_checkblock import load_test_vectors
+
+class Test_TxColumns(unittest.TestCase):
+    def setUp(self):
+        self.blocks = [blk for (comment, fHeader, fCheckPoW, cur_time, blk)
+                       in load_test_vectors('checkblock_valid.json')
+                       if not fHeader]
+
+    def test_from_block(self):
+        for blk in self.blocks:
+            columns = TxColumns.from_block(blk.serialize())
+            self.assertEqual(columns.header.GetHash(), blk.GetHash())
+            self.assertEqual(len(columns), len(blk.vtx))
+            self.assertEqual(len(columns.nValue), sum(len(tx.vout) for tx in blk.vtx))
+
+            for view, tx in zip(columns, blk.vtx):
+                self.assertEqual(view, tx)
+                self.assertEqual(view.to_tx(), tx)
+                self.assertEqual(view.GetTxid(), tx.GetTxid())
+                self.assertEqual(view.is_coinbase(), tx.is_coinbase())
+                self.assertEqual(view.nVersion, tx.nVersion)
+                self.assertEqual(view.nLockTime, tx.nLockTime)
+
+                for txin_view, txin in zip(view.vin, tx.vin):
+                    self.assertEqual(txin_view.prevout, txin.prevout)
+                    self.assertEqual(txin_view.scriptSig, txin.scriptSig)
+                    self.assertEqual(txin_view.nSequence, txin.nSequence)
+                for txout_view, txout in zip(view.vout, tx.vout):
+                    self.assertEqual(txout_view.nValue, txout.nValue)
+                    self.assertEqual(txout_view.scriptPubKey, txout.scriptPubKey)
+                    self.assertEqual(txout_view.is_valid(), txout.is_valid())
+
+                # Views can be used to build transactions
+                self.assertEqual(CTransaction(view.vin, view.vout, view.nLockTime, view.nVersion), tx)
+
+            self.assertEqual(columns[-1], blk.vtx[-1])
+            self.assertEqual(columns[:], tuple(columns))
+
+    def test_truncated(self):
+        serialized = self.blocks[-1].serialize()
+        for i in range(80, len(serialized)):
+            with self.assertRaises(SerializationTruncationError):
+                TxColumns.from_block(serialized[:i])
@@ -14,6 +14,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import unittest
 
 from bitcoincash.core import *
+from bitcoincash.core.serialize import SerializationTruncationError
 
 class Test_str_value(unittest.TestCase):
     def test(self):
@@ -84,6 +85,15 @@ class Test_CBlockHeader(unittest.TestCase):
         T(436527338,  3438908.960) # block 210000
         T(426957810, 37392766.136) # block 250000
 
+def make_block(n):
+    """Make a block of n transactions"""
+    coinbase = CoreMainParams.GENESIS_BLOCK.vtx[0]
+    vtx = [coinbase]
+    for i in range(1, n):
+        txin = CTxIn(COutPoint(coinbase.GetTxid(), i), coinbase.vin[0].scriptSig)
+        vtx.append(CTransaction([txin], coinbase.vout))
+    return CBlock(hashMerkleRoot=CBlock.build_merkle_tree_from_txs(vtx)[-1], vtx=vtx)
+
 class Test_CBlock(unittest.TestCase):
     def test_serialization(self):
         initial_serialized = x('0100000000000000000000000000000000000000000000000000000000000000000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa4b1e5e4a29ab5f49ffff001d1dac2b7c0101000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4d04ffff001d0104455468652054696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f66207365636f6e64206261696c6f757420666f722062616e6b73ffffffff0100f2052a01000000434104678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5fac00000000')
@@ -120,3 +130,139 @@ class Test_CBlock(unittest.TestCase):
         # 99993 four transactions
         block = CBlock.deserialize(x('01000000acda3db591d5c2c63e8c09e7523a5b0581707ef3e3520d6ca180000000000000701179cb9a9e0fe709cc96261b6b943b31362b61dacba94b03f9b71a06cc2eff7d1c1b4d4c86041b75962f880401000000010000000000000000000000000000000000000000000000000000000000000000ffffffff07044c86041b0152ffffffff014034152a01000000434104216220ab283b5e2871c332de670d163fb1b7e509fd67db77997c5568e7c25afd988f19cd5cc5aec6430866ec64b5214826b28e0f7a86458073ff933994b47a5cac0000000001000000042a40ae58b06c3a61ae55dbee05cab546e80c508f71f24ef0cdc9749dac91ea5f000000004a49304602210089c685b37903c4aa62d984929afeaca554d1641f9a668398cd228fb54588f06b0221008a5cfbc5b0a38ba78c4f4341e53272b9cd0e377b2fb740106009b8d7fa693f0b01ffffffff7b999491e30af112b11105cb053bc3633a8a87f44740eb158849a76891ff228b00000000494830450221009a4aa8663ff4017063d2020519f2eade5b4e3e30be69bf9a62b4e6472d1747b2022021ee3b3090b8ce439dbf08a5df31e2dc23d68073ebda45dc573e8a4f74f5cdfc01ffffffffdea82ec2f9e88e0241faa676c13d093030b17c479770c6cc83239436a4327d49000000004a493046022100c29d9de71a34707c52578e355fa0fdc2bb69ce0a957e6b591658a02b1e039d69022100f82c8af79c166a822d305f0832fb800786d831aea419069b3aed97a6edf8f02101fffffffff3e7987da9981c2ae099f97a551783e1b21669ba0bf3aca8fe12896add91a11a0000000049483045022100e332c81781b281a3b35cf75a5a204a2be451746dad8147831255291ebac2604d02205f889a2935270d1bf1ef47db773d68c4d5c6a51bb51f082d3e1c491de63c345601ffffffff0100c817a8040000001976a91420420e56079150b50fb0617dce4c374bd61eccea88ac00000000010000000265a7293b2d69ba51d554cd32ac7586f7fbeaeea06835f26e03a2feab6aec375f000000004a493046022100922361eaafe316003087d355dd3c0ef3d9f44edae661c212a28a91e020408008022100c9b9c84d53d82c0ba9208f695c79eb42a453faea4d19706a8440e1d05e6cff7501fffffffff6971f00725d17c1c531088144b45ed795a307a22d51ca377c6f7f93675bb03a000000008b483045022100d060f2b2f4122edac61a25ea06396fe9135affdabc66d350b5ae1813bc6bf3f302205d8363deef2101fc9f3d528a8b3907e9d29c40772e587dcea12838c574cb80f801410449fce4a25c972a43a6bc67456407a0d4ced782d4cf8c0a35a130d5f65f0561e9f35198349a7c0b4ec79a15fead66bd7642f17cc8c40c5df95f15ac7190c76442ffffffff0200f2052a010000001976a914c3f537bc307c7eda43d86b55695e46047b770ea388ac00cf7b05000000001976a91407bef290008c089a60321b21b1df2d7f2202f40388ac0000000001000000014ab7418ecda2b2531eef0145d4644a4c82a7da1edd285d1aab1ec0595ac06b69000000008c493046022100a796490f89e0ef0326e8460edebff9161da19c36e00c7408608135f72ef0e03e0221009e01ef7bc17cddce8dfda1f1a6d3805c51f9ab2f8f2145793d8e85e0dd6e55300141043e6d26812f24a5a9485c9d40b8712215f0c3a37b0334d76b2c24fcafa587ae5258853b6f49ceeb29cd13ebb76aa79099fad84f516bbba47bd170576b121052f1ffffffff0200a24a04000000001976a9143542e17b6229a25d5b76909f9d28dd6ed9295b2088ac003fab01000000001976a9149cea2b6e3e64ad982c99ebba56a882b9e8a816fe88ac00000000'))
         self.assertEqual(block.calc_merkle_root(), lx('ff2ecc061ab7f9034ba9cbda612b36313b946b1b2696cc09e70f9e9acb791170'))
+
+    def test_get_merkle_branch(self):
+        for n in range(1, 10):
+            block = make_block(n)
+            proofs = []
+            for i, tx in enumerate(block.vtx):
+                branch = block.get_merkle_branch(i)
+                self.assertEqual(CBlock.calc_merkle_root_from_branch(tx.GetTxid(), i, branch),
+                                 block.hashMerkleRoot)
+                proofs.append((tx.GetTxid(), i, branch))
+            self.assertEqual(block.get_merkle_branch(-1), proofs[-1][2])
+            self.assertEqual(verify_merkle_branches(block, proofs), [True] * n)
+            self.assertEqual(verify_merkle_branches(block.hashMerkleRoot, proofs), [True] * n)
+
+            with self.assertRaises(IndexError):
+                block.get_merkle_branch(n)
+
+        # Wrong index, wrong txid, and an index beyond the depth of the branch
+        txid, index, branch = proofs[3]
+        self.assertEqual(verify_merkle_branches(block, [(txid, index + 1, branch),
+                                                        (proofs[4][0], index, branch),
+                                                        (txid, index + 2**len(branch), branch),
+                                                        (txid, index, branch)]),
+                         [False, False, False, True])
+
+class Test_MerkleTemplate(unittest.TestCase):
+    def test(self):
+        template = MerkleTemplate()
+        for n in range(1, 20):
+            block = make_block(n)
+            txids = [tx.GetTxid() for tx in block.vtx]
+
+            self.assertEqual(len(template), n)
+            self.assertEqual(template.merkle_steps, block.get_merkle_branch(0))
+            self.assertEqual(template.calc_merkle_root(txids[0]), block.hashMerkleRoot)
+            self.assertEqual(MerkleTemplate(txids[1:]).merkle_steps, template.merkle_steps)
+
+            # A different coinbase gives the root of the tree with that coinbase
+            other_coinbase = Hash(txids[0])
+            self.assertEqual(template.calc_merkle_root(other_coinbase),
+                             CBlock.build_merkle_tree_from_txids([other_coinbase] + txids[1:])[-1])
+
+            template.append(make_block(n + 1).vtx[-1].GetTxid())
+
+class Test_CPartialMerkleTree(unittest.TestCase):
+    def test_build_and_extract(self):
+        for n in (1, 2, 3, 5, 8, 13):
+            block = make_block(n)
+            txids = [tx.GetTxid() for tx in block.vtx]
+            for selected in ((), (0,), (n-1,), tuple(range(0, n, 3)), tuple(range(n))):
+                tree = CPartialMerkleTree.from_txids(txids, [i in selected for i in range(n)])
+                tree = CPartialMerkleTree.deserialize(tree.serialize())
+                self.assertEqual(tree.nTransactions, n)
+                merkle_root, matches = tree.extract_matches()
+                self.assertEqual(merkle_root, block.hashMerkleRoot)
+                self.assertEqual(matches, [(i, txids[i]) for i in selected])
+
+    def test_malformed(self):
+        txids = [tx.GetTxid() for tx in make_block(7).vtx]
+        tree = CPartialMerkleTree.from_txids(txids, [False, True] + [False] * 5)
+
+        def check_bad(nTransactions, vBits, vHash):
+            with self.assertRaises(PartialMerkleTreeError):
+                CPartialMerkleTree(nTransactions, vBits, vHash).extract_matches()
+
+        check_bad(0, (), ())
+        check_bad(tree.nTransactions, tree.vBits, tree.vHash[:-1])
+        check_bad(tree.nTransactions, tree.vBits, tree.vHash + (txids[0],))
+        check_bad(tree.nTransactions, tree.vBits[:-1], tree.vHash)
+        check_bad(tree.nTransactions, tree.vBits + (False,) * 8, tree.vHash)
+
+        # CVE-2012-2459: duplicating the last transaction gives the same root
+        tree = CPartialMerkleTree.from_txids(txids + txids[-1:], [True] * 8)
+        merkle_root, matches = CPartialMerkleTree.from_txids(txids, [True] * 7).extract_matches()
+        self.assertEqual(CBlock.build_merkle_tree_from_txids(txids + txids[-1:])[-1], merkle_root)
+        with self.assertRaises(PartialMerkleTreeError):
+            tree.extract_matches()
+
+class Test_CMerkleBlock(unittest.TestCase):
+    def test(self):
+        block = make_block(6)
+        txids = [tx.GetTxid() for tx in block.vtx]
+
+        merkleblock = CMerkleBlock.from_block(block, {txids[2], txids[5]})
+        self.assertEqual(merkleblock.vMatchedTxn, ((2, txids[2]), (5, txids[5])))
+        self.assertEqual(merkleblock.GetHash(), block.GetHash())
+
+        merkleblock = CMerkleBlock.deserialize(merkleblock.serialize())
+        self.assertEqual(merkleblock.get_matches(), [(2, txids[2]), (5, txids[5])])
+
+        merkleblock = CMerkleBlock.from_block(block, lambda txid: txid == txids[0])
+        self.assertEqual(merkleblock.get_matches(), [(0, txids[0])])
+
+        # Header from another block
+        merkleblock = CMerkleBlock(make_block(5).get_header(), merkleblock.txn)
+        with self.assertRaises(PartialMerkleTreeError):
+            merkleblock.get_matches()
+
+class Test_LazyCBlock(unittest.TestCase):
+    def make_block(self, n):
+        return make_block(n)
+
+    def test_deserialize(self):
+        for n in (1, 2, 3, 7):
+            block = self.make_block(n)
+            serialized = block.serialize()
+
+            lazy = LazyCBlock.deserialize(serialized)
+            self.assertIsInstance(lazy, CBlock)
+            self.assertEqual(lazy.GetHash(), block.GetHash())
+            self.assertEqual(lazy.serialize(), serialized)
+            self.assertEqual(lazy.GetSerializeSize(), len(serialized))
+            self.assertEqual(block.GetSerializeSize(), len(serialized))
+            self.assertEqual(len(lazy.vtx), n)
+
+            # Transactions are decoded on access, and only once
+            self.assertEqual(lazy.vtx[-1], block.vtx[-1])
+            self.assertIs(lazy.vtx[n-1], lazy.vtx[-1])
+            self.assertEqual(lazy.vtx[1:], block.vtx[1:])
+            self.assertEqual(list(lazy.vtx), list(block.vtx))
+
+            self.assertEqual(lazy.get_txid(-1), block.vtx[-1].GetTxid())
+            self.assertEqual(lazy.vMerkleTree, block.vMerkleTree)
+            self.assertEqual(lazy.calc_merkle_root(), block.hashMerkleRoot)
+            CheckBlock(lazy, fCheckPoW=False)
+
+    def test_deserialize_padding_and_truncation(self):
+        serialized = self.make_block(3).serialize()
+
+        lazy, pos = LazyCBlock.buffer_deserialize(memoryview(serialized + b'\xff'))
+        self.assertEqual(pos, len(serialized))
+        self.assertEqual(lazy.serialize(), serialized)
+
+        for i in (0, 79, 81, len(serialized) - 1):
+            with self.assertRaises(SerializationTruncationError):
+                LazyCBlock.deserialize(serialized[:i])
@@ -39,3 +39,13 @@ class Test_CPubKey(unittest.TestCase):
 
         T('0478d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71a1518063243acd4dfe96b66e3f2ec8013c8e072cd09b3834a19f81f659cc3455',
           True, True, False)
+
+class Test_CECKey(unittest.TestCase):
+    def test_normalize_signature(self):
+        sig = x('3044022057292e2d4dfe775becdd0a9e6547997c728cdf35390f6a017da56d654d374e4902206b643be2fc53763b4e284845bfea2c597d2dc7759941dce937636c9d341b71ed')
+        self.assertEqual(CECKey.normalize_signature(sig), sig)
+
+        # Truncated and garbage signatures don't parse, and are invalid
+        for bad_sig in (b'', sig[1:], sig[:-1], b'\x30'):
+            self.assertIsNone(CECKey.normalize_signature(bad_sig))
+            self.assertFalse(CECKey().verify(b'\x00' * 32, bad_sig))
@@ -14,7 +14,7 @@ import unittest
 from bitcoincash.messages import msg_version, msg_verack, msg_addr, msg_alert, \
     msg_inv, msg_getdata, msg_getblocks, msg_getheaders, msg_headers, msg_tx, \
     msg_block, msg_getaddr, msg_ping, msg_pong, msg_mempool, MsgSerializable, \
-    msg_notfound, msg_reject
+    msg_notfound, msg_reject, msg_merkleblock
 
 import sys
 if sys.version > '3':
@@ -92,6 +92,11 @@ class Test_msg_block(MessageTestCase):
         super(Test_msg_block, self).serialization_test(msg_block)
 
 
+class Test_msg_merkleblock(MessageTestCase):
+    def test_serialization(self):
+        super(Test_msg_merkleblock, self).serialization_test(msg_merkleblock)
+
+
 class Test_msg_getaddr(MessageTestCase):
     def test_serialization(self):
         super(Test_msg_getaddr, self).serialization_test(msg_getaddr)
@@ -0,0 +1,158 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import concurrent.futures
+import functools
+import multiprocessing
+import struct
+import unittest
+import unittest.mock
+
+import bitcoincash
+import bitcoincash.parallel
+from bitcoincash.core import (
+        CBlock,
+        CheckBlock,
+        CheckBlockError,
+        CheckBlockHeaderError,
+        CMutableTransaction,
+        COutPoint,
+        CoreRegTestParams,
+        CTransaction,
+        CTxIn,
+        CTxOut,
+        )
+from bitcoincash.core.script import CScript
+from bitcoincash.core.serialize import Hash, SerializationTruncationError
+from bitcoincash.parallel import *
+from bitcoincash.tests.test_checkblock import load_test_vectors
+
+class Test_decode_blocks(unittest.TestCase):
+    def setUp(self):
+        self.blocks = [blk for (comment, fHeader, fCheckPoW, cur_time, blk)
+                       in load_test_vectors('checkblock_valid.json')
+                       if not fHeader]
+
+    def check_results(self, results):
+        self.assertEqual(len(results), len(self.blocks))
+        for result, blk in zip(results, self.blocks):
+            serialized = blk.serialize()
+            self.assertEqual(result.hash, blk.GetHash())
+            self.assertEqual(result.header.GetHash(), blk.GetHash())
+            self.assertEqual(result.txids, tuple(tx.GetTxid() for tx in blk.vtx))
+            self.assertEqual(result.tx_offsets[-1], len(serialized))
+            for i, tx in enumerate(blk.vtx):
+                self.assertEqual(serialized[result.tx_offsets[i]:result.tx_offsets[i+1]],
+                                 tx.serialize())
+                self.assertEqual(result.outputs[i],
+                                 tuple((txout.nValue, txout.scriptPubKey) for txout in tx.vout))
+
+    def test_in_process(self):
+        self.check_results(list(decode_blocks((blk.serialize() for blk in self.blocks), workers=1)))
+
+    def test_workers(self):
+        self.check_results(list(decode_blocks([blk.serialize() for blk in self.blocks], workers=2)))
+
+        results = list(decode_transactions([tx.serialize() for tx in self.blocks[0].vtx],
+                                           workers=2, outputs=False))
+        self.assertEqual([r.txid for r in results], [tx.GetTxid() for tx in self.blocks[0].vtx])
+        self.assertIsNone(results[0].outputs)
+
+    def test_errors(self):
+        serialized = self.blocks[0].serialize()
+        with self.assertRaises(SerializationTruncationError):
+            list(decode_blocks([serialized[:-1]], workers=2))
+
+        # A changed transaction, with the header and so its PoW left alone
+        blk = self.blocks[0]
+        coinbase = CMutableTransaction.from_tx(blk.vtx[0])
+        coinbase.vout[0].nValue -= 1
+        bad_block = CBlock(blk.nVersion, blk.hashPrevBlock, blk.hashMerkleRoot,
+                           blk.nTime, blk.nBits, blk.nNonce,
+                           vtx=[CTransaction.from_tx(coinbase)] + list(blk.vtx[1:]))
+        self.assertEqual(bad_block.serialize()[:80], serialized[:80])
+        for workers in (1, 2):
+            with self.assertRaisesRegex(CheckBlockError, 'hashMerkleRoot mismatch'):
+                list(decode_blocks([bad_block.serialize()], workers=workers, check=True))
+
+    def test_params(self):
+        # Workers that aren't forked check blocks with the chain parameters
+        # selected in this process.
+        spawn_executor = functools.partial(concurrent.futures.ProcessPoolExecutor,
+                                           mp_context=multiprocessing.get_context('spawn'))
+        regtest_genesis = CoreRegTestParams.GENESIS_BLOCK.serialize()
+        with unittest.mock.patch('concurrent.futures.ProcessPoolExecutor', spawn_executor):
+            with self.assertRaises(CheckBlockHeaderError):
+                list(decode_blocks([regtest_genesis], workers=2, check=True))
+
+            bitcoincash.SelectParams('regtest')
+            try:
+                results = list(decode_blocks([regtest_genesis], workers=2, check=True))
+            finally:
+                bitcoincash.SelectParams('mainnet')
+        self.assertEqual(results[0].hash, CoreRegTestParams.GENESIS_BLOCK.GetHash())
+
+class Test_map_ordered(unittest.TestCase):
+    def test(self):
+        for workers in (1, 2):
+            self.assertEqual(list(map_ordered(pow, range(20), workers, (2,))),
+                             [i ** 2 for i in range(20)])
+
+        results = map_ordered(int, ['1', 'x'], workers=2)
+        self.assertEqual(next(results), 1)
+        with self.assertRaises(ValueError):
+            next(results)
+
+class Test_build_merkle_tree(unittest.TestCase):
+    def setUp(self):
+        # Small chunks, so that small trees are split
+        self.chunk_size = bitcoincash.parallel.MERKLE_CHUNK_SIZE
+        self.threshold = bitcoincash.parallel.MERKLE_PARALLEL_THRESHOLD
+        bitcoincash.parallel.MERKLE_CHUNK_SIZE = 4
+        bitcoincash.parallel.MERKLE_PARALLEL_THRESHOLD = 16
+
+    def tearDown(self):
+        bitcoincash.parallel.MERKLE_CHUNK_SIZE = self.chunk_size
+        bitcoincash.parallel.MERKLE_PARALLEL_THRESHOLD = self.threshold
+
+    def test_build_merkle_tree(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            for n in (1, 2, 3, 4, 5, 8, 9, 15, 16, 17, 31, 33):
+                txids = [Hash(struct.pack(b'<I', i)) for i in range(n)]
+                expected = CBlock.build_merkle_tree_from_txids(txids)
+                self.assertEqual(build_merkle_tree(txids, executor=executor), expected)
+                self.assertEqual(build_merkle_tree(txids, workers=1), expected)
+
+    def test_workers(self):
+        txids = [Hash(struct.pack(b'<I', i)) for i in range(21)]
+        self.assertEqual(build_merkle_tree(txids, workers=2),
+                         CBlock.build_merkle_tree_from_txids(txids))
+
+    def test_check_block(self):
+        vtx = [CTransaction([CTxIn(COutPoint(), CScript([1, 2]))], [CTxOut(0)])]
+        vtx += [CTransaction([CTxIn(COutPoint(Hash(struct.pack(b'<I', i)), 0))], [CTxOut(0)])
+                for i in range(20)]
+        hashMerkleRoot = CBlock.build_merkle_tree_from_txs(vtx)[-1]
+        good_block = CBlock(hashMerkleRoot=hashMerkleRoot, vtx=vtx)
+        bad_block = CBlock(hashMerkleRoot=b'\x00' * 32, vtx=vtx)
+
+        # The merkle tree is only built by workers when asked for
+        with unittest.mock.patch.object(bitcoincash.parallel, 'build_merkle_tree',
+                                        wraps=build_merkle_tree) as build:
+            CheckBlock(good_block, fCheckPoW=False)
+            self.assertFalse(build.called)
+
+            CheckBlock(good_block, fCheckPoW=False, workers=2)
+            with self.assertRaisesRegex(CheckBlockError, 'hashMerkleRoot mismatch'):
+                CheckBlock(bad_block, fCheckPoW=False, workers=2)
+            self.assertEqual(build.call_count, 2)
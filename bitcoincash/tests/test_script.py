@@ -428,6 +428,58 @@ class Test_CScript(unittest.TestCase):
         with self.assertRaises(ValueError):
             CScript([b'a' * 518]).to_p2sh_scriptPubKey()
 
+    def test_raw_iter(self):
+        script = CScript(x('76a914') + b'\x00'*20 + x('88ac'))
+        expected = [(OP_DUP, None, 0), (OP_HASH160, None, 1), (0x14, b'\x00'*20, 2),
+                    (OP_EQUALVERIFY, None, 23), (OP_CHECKSIG, None, 24)]
+        self.assertEqual(list(script.raw_iter()), expected)
+
+        # The same decoding is returned for scripts with the same bytes
+        self.assertEqual(list(CScript(bytes(script)).raw_iter()), expected)
+
+        # Scripts too big to be cached are decoded every time
+        big = CScript([b'\xff'*MAX_CACHED_SCRIPT_SIZE, OP_DROP])
+        self.assertEqual(list(big.raw_iter()),
+                         [(OP_PUSHDATA2, b'\xff'*MAX_CACHED_SCRIPT_SIZE, 0),
+                          (OP_DROP, None, MAX_CACHED_SCRIPT_SIZE + 3)])
+
+    def test_raw_iter_truncated(self):
+        # The opcodes before the error are yielded every time
+        script = CScript(x('6a4c0201'))
+        for i in range(2):
+            i = script.raw_iter()
+            self.assertEqual(next(i), (OP_RETURN, None, 0))
+            with self.assertRaises(CScriptTruncatedPushDataError) as cm:
+                next(i)
+            self.assertEqual(cm.exception.data, b'\x01')
+            self.assertEqual(str(cm.exception), 'PUSHDATA1: truncated data')
+
+    def test_GetSigOpCount(self):
+        def T(script, inaccurate, accurate):
+            script = CScript(script)
+            self.assertEqual(script.GetSigOpCount(False), inaccurate)
+            self.assertEqual(script.GetSigOpCount(True), accurate)
+
+        pubkey = x('029b6d2c97b8b7c718c325d7be3ac30f7c9d67651bce0c929f55ee77ce58efcf84')
+        T([], 0, 0)
+        T([OP_DUP, OP_HASH160, b'\x00'*20, OP_EQUALVERIFY, OP_CHECKSIG], 1, 1)
+        T([1, pubkey, pubkey, 2, OP_CHECKMULTISIG], 20, 2)
+        T([1, pubkey, pubkey, 2, OP_CHECKMULTISIGVERIFY, OP_CHECKSIGVERIFY], 21, 3)
+        T([pubkey, OP_CHECKMULTISIG], 20, 20)
+
+    def test_FindAndDelete(self):
+        def T(script, sig, expected):
+            self.assertEqual(FindAndDelete(CScript(script), CScript(sig)), CScript(expected))
+
+        T([OP_1, OP_2, OP_3], [OP_2], [OP_1, OP_3])
+        T([OP_1, OP_2, OP_2, OP_3], [OP_2], [OP_1, OP_3])
+        T([OP_1, OP_2, OP_3], [OP_4], [OP_1, OP_2, OP_3])
+        T([b'\x02\x52'], [OP_2], [b'\x02\x52'])
+
+        # Invalid scripts raise whether or not anything would be deleted
+        with self.assertRaises(CScriptInvalidError):
+            FindAndDelete(CScript(x('0201')), CScript([OP_4]))
+
 class Test_IsLowDERSignature(unittest.TestCase):
     def test_high_s_value(self):
         sig = x('3046022100820121109528efda8bb20ca28788639e5ba5b365e0a84f8bd85744321e7312c6022100a7c86a21446daa405306fe10d0a9906e37d1a2c6b6fdfaaf6700053058029bbe')
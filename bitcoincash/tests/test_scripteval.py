@@ -11,9 +11,11 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
 import json
 import os
 import unittest
+import unittest.mock
 
 import sys
 if sys.version > '3':
@@ -24,6 +26,11 @@ from binascii import unhexlify
 from bitcoincash.core import *
 from bitcoincash.core.script import *
 from bitcoincash.core.scripteval import *
+from bitcoincash.core.scripteval import SCRIPT_ENABLE_SIGHASH_FORKID, SCRIPT_VERIFY_NULLFAIL
+from bitcoincash.core.sigcache import ScriptCache
+from bitcoincash.wallet import CKey, P2PKHBitcoinAddress, sign_inputs
+import bitcoincash.core.sigcache
+import bitcoincash.parallel
 
 def parse_script(s):
     def ishex(s):
@@ -130,3 +137,205 @@ class Test_EvalScript(unittest.TestCase):
 
             if failcode != "OK":
                 self.fail('Expected {} to fail'.format(test_case))
+
+class Test_ScriptVerifyFlags(unittest.TestCase):
+    def test_new(self):
+        flags = SCRIPT_VERIFY_P2SH | SCRIPT_VERIFY_STRICTENC
+        self.assertIsInstance(flags, ScriptVerifyFlags)
+        self.assertEqual(ScriptVerifyFlags(), 0)
+        self.assertEqual(ScriptVerifyFlags(()), 0)
+        self.assertEqual(ScriptVerifyFlags((SCRIPT_VERIFY_P2SH, SCRIPT_VERIFY_STRICTENC)), flags)
+        self.assertEqual(ScriptVerifyFlags({SCRIPT_VERIFY_STRICTENC, SCRIPT_VERIFY_P2SH}), flags)
+        self.assertEqual(ScriptVerifyFlags(3), flags)
+        self.assertIs(ScriptVerifyFlags(flags), flags)
+
+        with self.assertRaises(TypeError):
+            ScriptVerifyFlags(('P2SH',))
+        with self.assertRaises(TypeError):
+            ScriptVerifyFlags((1,))
+
+    def test_operators(self):
+        flags = SCRIPT_VERIFY_P2SH | SCRIPT_VERIFY_CLEANSTACK
+        self.assertIsInstance(0 | flags, ScriptVerifyFlags)
+        self.assertTrue(flags & SCRIPT_VERIFY_CLEANSTACK)
+        self.assertFalse(flags & SCRIPT_VERIFY_STRICTENC)
+        self.assertIn(SCRIPT_VERIFY_P2SH, flags)
+        self.assertIn(flags, flags)
+        self.assertNotIn(SCRIPT_VERIFY_STRICTENC, flags)
+        self.assertNotIn(SCRIPT_VERIFY_P2SH | SCRIPT_VERIFY_STRICTENC, flags)
+
+    def test_iter(self):
+        flags = SCRIPT_VERIFY_CLEANSTACK | SCRIPT_VERIFY_P2SH
+        self.assertEqual(list(flags), [SCRIPT_VERIFY_P2SH, SCRIPT_VERIFY_CLEANSTACK])
+        self.assertEqual(list(ScriptVerifyFlags()), [])
+        self.assertEqual(ScriptVerifyFlags(SCRIPT_VERIFY_FLAGS_BY_NAME.values()),
+                         (1 << len(SCRIPT_VERIFY_FLAGS_BY_NAME)) - 1)
+
+    def test_repr(self):
+        self.assertEqual(repr(SCRIPT_VERIFY_P2SH | SCRIPT_VERIFY_CLEANSTACK),
+                         'ScriptVerifyFlags(P2SH|CLEANSTACK)')
+        self.assertEqual(repr(ScriptVerifyFlags()), 'ScriptVerifyFlags(0)')
+
+    def test_hash(self):
+        d = {ScriptVerifyFlags((SCRIPT_VERIFY_STRICTENC, SCRIPT_VERIFY_P2SH)): True}
+        self.assertIn(SCRIPT_VERIFY_P2SH | SCRIPT_VERIFY_STRICTENC, d)
+        self.assertNotIn(SCRIPT_VERIFY_P2SH, d)
+
+class Test_VerifyScript_templates(unittest.TestCase):
+    def setUp(self):
+        # Every signature must be verified by both paths
+        self.orig_signature_cache = bitcoincash.core.sigcache.signature_cache
+        bitcoincash.core.sigcache.signature_cache = None
+
+        self.keys = [CKey(hashlib.sha256(bytes([i])).digest()) for i in range(4)]
+        self.p2pkh = P2PKHBitcoinAddress.from_pubkey(self.keys[0].pub).to_scriptPubKey()
+        self.redeemScript = CScript([2] + [key.pub for key in self.keys[1:]] + [3, OP_CHECKMULTISIG])
+        self.p2sh = self.redeemScript.to_p2sh_scriptPubKey()
+        self.tx = CTransaction([CTxIn(COutPoint(b'\x01' * 32, 0)), CTxIn(COutPoint(b'\x01' * 32, 1))],
+                               [CTxOut(1000, self.p2pkh)])
+        self.flags = (SCRIPT_VERIFY_P2SH, SCRIPT_ENABLE_SIGHASH_FORKID, SCRIPT_VERIFY_NULLDUMMY)
+
+    def tearDown(self):
+        bitcoincash.core.sigcache.signature_cache = self.orig_signature_cache
+
+    def sign(self, key, script, inIdx, amount=2000):
+        hashtype = SIGHASH_ALL | SIGHASH_FORKID
+        h = SignatureHash(script, self.tx, inIdx, hashtype, amount=amount)
+        return key.signECDSA(h) + bytes([hashtype])
+
+    def verify(self, scriptSig, scriptPubKey, inIdx, flags):
+        try:
+            VerifyScript(scriptSig, scriptPubKey, self.tx, inIdx, flags, amount=2000)
+        except ValidationError as err:
+            return (type(err), str(err), getattr(err, 'stack', None), getattr(err, 'sop_pc', None))
+
+    def T(self, scriptSig, scriptPubKey, inIdx, flags=None, fast=True):
+        """Check the fast path gives the same result as the interpreter"""
+        if flags is None:
+            flags = self.flags
+        result = self.verify(scriptSig, scriptPubKey, inIdx, flags)
+
+        standard = bitcoincash.core.scripteval._VerifyStandardScript
+        bitcoincash.core.scripteval._VerifyStandardScript = lambda *args: False
+        try:
+            self.assertEqual(result, self.verify(scriptSig, scriptPubKey, inIdx, flags))
+        finally:
+            bitcoincash.core.scripteval._VerifyStandardScript = standard
+
+        if fast and result is None:
+            self.assertTrue(standard(scriptSig, scriptPubKey, self.tx, inIdx, ScriptVerifyFlags(flags), 2000,
+                                     PrecomputedTransactionData(self.tx)))
+        return result
+
+    def test_p2pkh(self):
+        sig = self.sign(self.keys[0], self.p2pkh, 0)
+        pubkey = self.keys[0].pub
+        self.assertIsNone(self.T(CScript([sig, pubkey]), self.p2pkh, 0))
+
+        bad_sig = self.sign(self.keys[0], self.p2pkh, 0, amount=1)
+        self.assertIsNotNone(self.T(CScript([bad_sig, pubkey]), self.p2pkh, 0))
+        self.assertIsNotNone(self.T(CScript([bad_sig, pubkey]), self.p2pkh, 0,
+                                    self.flags + (SCRIPT_VERIFY_NULLFAIL,)))
+        self.assertIsNotNone(self.T(CScript([b'', pubkey]), self.p2pkh, 0))
+        self.assertIsNotNone(self.T(CScript([sig, self.keys[1].pub]), self.p2pkh, 0))
+
+        # Not the template, so verified by the interpreter
+        self.assertIsNone(self.T(CScript([1, sig, pubkey]), self.p2pkh, 0, fast=False))
+        self.assertIsNotNone(self.T(CScript([1, sig, pubkey]), self.p2pkh, 0,
+                                    self.flags + (SCRIPT_VERIFY_CLEANSTACK,)))
+        self.assertIsNone(self.T(CScript([sig, pubkey, OP_NOP]), self.p2pkh, 0, fast=False))
+
+    def test_p2sh_multisig(self):
+        sigs = [self.sign(key, self.redeemScript, 1) for key in self.keys[1:]]
+        for i, j in ((0, 1), (0, 2), (1, 2)):
+            self.assertIsNone(self.T(CScript([b'', sigs[i], sigs[j], self.redeemScript]), self.p2sh, 1))
+
+        # Signatures out of order
+        self.assertIsNotNone(self.T(CScript([b'', sigs[1], sigs[0], self.redeemScript]), self.p2sh, 1))
+
+        bad_sig = self.sign(self.keys[1], self.redeemScript, 1, amount=1)
+        self.assertIsNotNone(self.T(CScript([b'', bad_sig, sigs[1], self.redeemScript]), self.p2sh, 1))
+
+        # Not the template, so verified by the interpreter
+        self.assertIsNotNone(self.T(CScript([b'\x01', sigs[0], sigs[1], self.redeemScript]), self.p2sh, 1))
+        self.assertIsNone(self.T(CScript([b'\x01', sigs[0], sigs[1], self.redeemScript]), self.p2sh, 1,
+                                 (SCRIPT_VERIFY_P2SH, SCRIPT_ENABLE_SIGHASH_FORKID), fast=False))
+        self.assertIsNotNone(self.T(CScript([b'', sigs[0], self.redeemScript]), self.p2sh, 1))
+        self.assertIsNone(self.T(CScript([b'', sigs[0], sigs[1], self.redeemScript]), self.p2sh, 1,
+                                 (SCRIPT_ENABLE_SIGHASH_FORKID,), fast=False))
+
+        redeemScript = CScript([1, self.keys[1].pub, 1, OP_CHECKMULTISIG])
+        self.assertIsNotNone(self.T(CScript([b'', sigs[0], redeemScript]), self.p2sh, 1))
+
+class Test_VerifyBlockScripts(unittest.TestCase):
+    def setUp(self):
+        # Not to be affected by, or add to, the process-wide cache
+        self.orig_script_cache = bitcoincash.core.sigcache.script_cache
+        bitcoincash.core.sigcache.script_cache = None
+
+        self.keys = [CKey(hashlib.sha256(bytes([i])).digest()) for i in range(3)]
+        self.scriptPubKeys = [P2PKHBitcoinAddress.from_pubkey(key.pub).to_scriptPubKey()
+                              for key in self.keys]
+        self.utxos = {COutPoint(hashlib.sha256(bytes([i])).digest(), 0):
+                          CTxOut(1000, self.scriptPubKeys[i % 3])
+                      for i in range(6)}
+        self.flags = (SCRIPT_VERIFY_P2SH, SCRIPT_ENABLE_SIGHASH_FORKID)
+
+        coinbase = CTransaction([CTxIn(COutPoint(), CScript([1, 2]))], [CTxOut(5000, self.scriptPubKeys[0])])
+        vtx = [coinbase]
+        outpoints = list(self.utxos)
+        for i in range(0, 6, 2):
+            vtx.append(self.spend(outpoints[i:i+2], [self.utxos[outpoint] for outpoint in outpoints[i:i+2]]))
+        # Spends an output created earlier in the block
+        vtx.append(self.spend([COutPoint(vtx[1].GetTxid(), 0)], [vtx[1].vout[0]]))
+        self.vtx = vtx
+
+    def tearDown(self):
+        bitcoincash.core.sigcache.script_cache = self.orig_script_cache
+
+    def spend(self, outpoints, txouts):
+        tx = CMutableTransaction([CMutableTxIn(outpoint) for outpoint in outpoints],
+                                 [CMutableTxOut(500, self.scriptPubKeys[1])])
+        inputs = []
+        for i, txout in enumerate(txouts):
+            key = self.keys[self.scriptPubKeys.index(txout.scriptPubKey)]
+            inputs.append((i, key, txout.scriptPubKey, txout.nValue, SIGHASH_ALL | SIGHASH_FORKID))
+        return sign_inputs(tx, inputs, algorithm='ecdsa')
+
+    def test_valid(self):
+        for workers in (1, 2):
+            VerifyBlockScripts(CBlock(vtx=self.vtx), self.utxos, self.flags, workers=workers)
+            VerifyBlockScripts(CBlock(vtx=self.vtx), self.utxos.get, self.flags, workers=workers)
+
+    def test_invalid(self):
+        # Second input of tx 2 and first input of tx 3 sign the wrong amounts
+        utxos = dict(self.utxos)
+        outpoints = list(self.utxos)
+        for outpoint in (outpoints[3], outpoints[4]):
+            utxos[outpoint] = CTxOut(1, utxos[outpoint].scriptPubKey)
+
+        for workers in (1, 2):
+            with self.assertRaises(VerifyBlockScriptsError) as cm:
+                VerifyBlockScripts(CBlock(vtx=self.vtx), utxos, self.flags, workers=workers)
+            self.assertEqual((cm.exception.tx_index, cm.exception.input_index), (2, 1))
+            self.assertIn('VerifyScriptError', str(cm.exception))
+
+    def test_missing_input(self):
+        utxos = dict(self.utxos)
+        del utxos[list(self.utxos)[5]]
+        for workers in (1, 2):
+            with self.assertRaises(VerifyBlockScriptsError) as cm:
+                VerifyBlockScripts(CBlock(vtx=self.vtx), utxos, self.flags, workers=workers)
+            self.assertEqual((cm.exception.tx_index, cm.exception.input_index), (3, 1))
+
+    def test_script_cache(self):
+        cache = bitcoincash.core.sigcache.script_cache = ScriptCache()
+        VerifyBlockScripts(CBlock(vtx=self.vtx), self.utxos, self.flags)
+        self.assertEqual(len(cache), 4)
+
+        # Cached transactions aren't verified again, so no workers are started
+        with unittest.mock.patch.object(bitcoincash.parallel, '_process_pool') as process_pool:
+            VerifyBlockScripts(CBlock(vtx=self.vtx), self.utxos, self.flags, workers=2)
+            VerifyBlockScripts(CBlock(vtx=self.vtx[:1]), self.utxos, self.flags, workers=2)
+        self.assertFalse(process_pool.called)
+        self.assertEqual(cache.hits, 4)
@@ -11,6 +11,7 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import struct
 import unittest, random
 
 from binascii import unhexlify
@@ -40,6 +41,70 @@ class Test_Serializable(unittest.TestCase):
 
         FooSerializable.deserialize(b'\x00', allow_padding=True)
 
+    def test_buffer_serialize(self):
+        class FooSerializable(Serializable):
+            def stream_serialize(self, f):
+                f.write(b'foo')
+
+        class BarSerializable(FooSerializable):
+            def buffer_serialize(self, buf, pos=0):
+                buf[pos:pos+3] = b'bar'
+                return pos + 3
+
+            def GetSerializeSize(self):
+                return 3
+
+        class BazSerializable(BarSerializable):
+            def stream_serialize(self, f):
+                f.write(b'baz')
+
+        buf = bytearray(4)
+        self.assertEqual(FooSerializable().buffer_serialize(buf, 1), 4)
+        self.assertEqual(buf, b'\x00foo')
+
+        # serialize() uses buffer_serialize() only if it's defined alongside
+        # stream_serialize()
+        self.assertEqual(FooSerializable().serialize(), b'foo')
+        self.assertEqual(BarSerializable().serialize(), b'bar')
+        self.assertEqual(BazSerializable().serialize(), b'baz')
+
+        # ...and GetSerializeSize(), as the default one calls serialize()
+        class QuxSerializable(FooSerializable):
+            def buffer_serialize(self, buf, pos=0):
+                buf[pos:pos+3] = b'qux'
+                return pos + 3
+
+        class QuuxSerializable(BarSerializable):
+            def stream_serialize(self, f):
+                f.write(b'quux')
+
+            def buffer_serialize(self, buf, pos=0):
+                buf[pos:pos+4] = b'quux'
+                return pos + 4
+
+        self.assertEqual(QuxSerializable().serialize(), b'foo')
+        self.assertEqual(QuxSerializable().GetSerializeSize(), 3)
+        self.assertEqual(QuuxSerializable().serialize(), b'quux')
+
+        class BufferOnlySerializable(Serializable):
+            def buffer_serialize(self, buf, pos=0):
+                return pos
+
+        with self.assertRaises(NotImplementedError):
+            BufferOnlySerializable().serialize()
+
+class Test_ser_unpack_from(unittest.TestCase):
+    def test(self):
+        buf = memoryview(b'\x00\x01\x00\x02\x00')
+        self.assertEqual(ser_unpack_from(b'<H', buf, 1), (1,))
+        self.assertEqual(ser_unpack_from(struct.Struct(b'<HH'), buf, 1), (1, 2))
+
+    def test_truncated(self):
+        buf = memoryview(b'\x00\x01\x00\x02')
+        for fmt in (b'<HH', struct.Struct(b'<HH')):
+            with self.assertRaises(SerializationTruncationError):
+                ser_unpack_from(fmt, buf, 1)
+
 class Test_VarIntSerializer(unittest.TestCase):
     def test(self):
         def T(value, expected):
@@ -84,6 +149,42 @@ class Test_VarIntSerializer(unittest.TestCase):
         T(b'ff')
         T(b'ff00000000000000')
 
+    def test_buffer_deserialize(self):
+        def T(serialized, expected_value):
+            buf = memoryview(b'\xaa' + unhexlify(serialized) + b'\xbb')
+            actual_value, pos = VarIntSerializer.buffer_deserialize(buf, 1)
+            self.assertEqual(actual_value, expected_value)
+            self.assertEqual(pos, len(buf) - 1)
+        T(b'00', 0)
+        T(b'fc', 0xfc)
+        T(b'fd3412', 0x1234)
+        T(b'fe67452301', 0x1234567)
+        T(b'ffefcdab8967452301', 0x123456789abcdef)
+
+    def test_buffer_serialize(self):
+        for value in (0, 0xfc, 0xfd, 0xffff, 0x10000, 0xffffffff,
+                      0x100000000, 0xffffffffffffffff):
+            expected = VarIntSerializer.serialize(value)
+            buf = bytearray(len(expected) + 2)
+            pos = VarIntSerializer.buffer_serialize(value, buf, 1)
+            self.assertEqual(pos, len(expected) + 1)
+            self.assertEqual(bytes(buf[1:pos]), expected)
+
+    def test_serialized_size(self):
+        for value in (0, 0xfc, 0xfd, 0xffff, 0x10000, 0xffffffff,
+                      0x100000000, 0xffffffffffffffff):
+            self.assertEqual(VarIntSerializer.serialized_size(value),
+                             len(VarIntSerializer.serialize(value)))
+
+    def test_buffer_deserialize_truncated(self):
+        def T(serialized):
+            with self.assertRaises(SerializationTruncationError):
+                VarIntSerializer.buffer_deserialize(memoryview(unhexlify(serialized)), 0)
+        T(b'')
+        T(b'fd00')
+        T(b'fe000000')
+        T(b'ff00000000000000')
+
 class Test_BytesSerializer(unittest.TestCase):
     def test(self):
         def T(value, expected):
@@ -0,0 +1,190 @@
+# Copyright (C) 2013-2014 The python-bitcoinlib developers
+#
+# This file is part of python-bitcoinlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-bitcoinlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import unittest
+
+import bitcoincash.core.sigcache
+from bitcoincash.core import COutPoint, CMutableTransaction, CMutableTxIn, CMutableTxOut, CTxOut
+from bitcoincash.core.script import (
+        CScript,
+        OP_CHECKSIG,
+        OP_CHECKSIGVERIFY,
+        OP_TRUE,
+        SIGHASH_ALL,
+        SIGHASH_FORKID,
+        SignatureHash,
+        )
+from bitcoincash.core.scripteval import (
+        SCRIPT_ENABLE_SIGHASH_FORKID,
+        SCRIPT_VERIFY_P2SH,
+        ScriptVerifyFlags,
+        VerifyScript,
+        VerifyScriptError,
+        VerifyTransactionScripts,
+        )
+from bitcoincash.core.sigcache import *
+from bitcoincash.wallet import CKey, P2PKHBitcoinAddress, sign_inputs
+
+class Test_SignatureCache(unittest.TestCase):
+    def test_lru(self):
+        cache = SignatureCache(3 * SignatureCache.ENTRY_SIZE)
+        self.assertEqual(cache.max_entries, 3)
+
+        for i in range(3):
+            cache.add(b'\x00' * 32, bytes([i]), b'sig')
+        self.assertTrue(cache.contains(b'\x00' * 32, b'\x00', b'sig'))
+
+        # Entry 1 is now the least recently used
+        cache.add(b'\x00' * 32, b'\x03', b'sig')
+        self.assertFalse(cache.contains(b'\x00' * 32, b'\x01', b'sig'))
+        for i in (0, 2, 3):
+            self.assertTrue(cache.contains(b'\x00' * 32, bytes([i]), b'sig'))
+
+        self.assertEqual(cache.stats(), {'entries': 3, 'max_entries': 3,
+                                         'hits': 4, 'misses': 1, 'evictions': 1})
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+
+    def test_framed(self):
+        # The same bytes split differently between pubkey and signature
+        cache = SignatureCache()
+        cache.add(b'\x00' * 32, b'pub', b'sig')
+        self.assertFalse(cache.contains(b'\x00' * 32, b'pubs', b'ig'))
+        self.assertFalse(cache.contains(b'\x00' * 32, b'pu', b'bsig'))
+
+    def test_salted(self):
+        # Different caches can't be probed with the same keys
+        self.assertNotEqual(SignatureCache()._key(b'h', b'p', b's'),
+                            SignatureCache()._key(b'h', b'p', b's'))
+
+class Test_ScriptCache(unittest.TestCase):
+    def test(self):
+        cache = ScriptCache()
+        outputs = [CTxOut(1, CScript([1]))]
+        flags = SCRIPT_VERIFY_P2SH | SCRIPT_ENABLE_SIGHASH_FORKID
+        cache.add(b'\x00' * 32, outputs, flags)
+
+        # Flags are compared as a bitmask, however they were combined
+        self.assertTrue(cache.contains(b'\x00' * 32, outputs,
+                                       ScriptVerifyFlags([SCRIPT_ENABLE_SIGHASH_FORKID, SCRIPT_VERIFY_P2SH])))
+        self.assertFalse(cache.contains(b'\x00' * 32, outputs, SCRIPT_VERIFY_P2SH))
+        self.assertFalse(cache.contains(b'\x00' * 32, [CTxOut(2, CScript([1]))], flags))
+        self.assertFalse(cache.contains(b'\x01' * 32, outputs, flags))
+
+class Test_CheckSig_cache(unittest.TestCase):
+    def setUp(self):
+        self.orig_cache = bitcoincash.core.sigcache.signature_cache
+        self.cache = bitcoincash.core.sigcache.signature_cache = SignatureCache()
+
+        key = CKey(hashlib.sha256(b'sigcache').digest())
+        self.scriptPubKey = P2PKHBitcoinAddress.from_pubkey(key.pub).to_scriptPubKey()
+        tx = CMutableTransaction([CMutableTxIn(COutPoint(b'\x01' * 32, 0))],
+                                 [CMutableTxOut(1000, self.scriptPubKey)])
+        self.tx = sign_inputs(tx, [(0, key, self.scriptPubKey, 2000, SIGHASH_ALL | SIGHASH_FORKID)],
+                              algorithm='ecdsa')
+
+    def tearDown(self):
+        bitcoincash.core.sigcache.signature_cache = self.orig_cache
+
+    def verify(self, amount=2000):
+        VerifyScript(self.tx.vin[0].scriptSig, self.scriptPubKey, self.tx, 0,
+                     flags=(SCRIPT_ENABLE_SIGHASH_FORKID,), amount=amount)
+
+    def test(self):
+        self.verify()
+        self.assertEqual((self.cache.hits, self.cache.misses, len(self.cache)), (0, 1, 1))
+        self.verify()
+        self.assertEqual((self.cache.hits, self.cache.misses, len(self.cache)), (1, 1, 1))
+
+        # Invalid signatures aren't cached
+        for i in range(2):
+            with self.assertRaises(VerifyScriptError):
+                self.verify(amount=1)
+        self.assertEqual((self.cache.hits, self.cache.misses, len(self.cache)), (1, 3, 1))
+
+    def test_pubkey_sig_split(self):
+        # The second CHECKSIG gets the pubkey and signature of the first one
+        # with a byte moved from the signature to the pubkey. The pubkey is
+        # invalid, so it must not hit the entry cached by the first.
+        key = CKey(hashlib.sha256(b'sigcache').digest())
+        scriptPubKey = CScript([key.pub, OP_CHECKSIGVERIFY, key.pub + b'\x30', OP_CHECKSIG])
+        tx = CMutableTransaction([CMutableTxIn(COutPoint(b'\x01' * 32, 0))],
+                                 [CMutableTxOut(1000, CScript([OP_TRUE]))])
+        hashtype = SIGHASH_ALL | SIGHASH_FORKID
+        sig = key.signECDSA(SignatureHash(scriptPubKey, tx, 0, hashtype, amount=2000)) + bytes([hashtype])
+        scriptSig = CScript([sig[1:], sig])
+
+        for i in range(2):
+            with self.assertRaises(VerifyScriptError):
+                VerifyScript(scriptSig, scriptPubKey, tx, 0,
+                             flags=(SCRIPT_ENABLE_SIGHASH_FORKID,), amount=2000)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_disabled(self):
+        bitcoincash.core.sigcache.signature_cache = None
+        self.verify()
+        self.verify()
+        self.assertEqual(len(self.cache), 0)
+
+class Test_VerifyTransactionScripts(unittest.TestCase):
+    def setUp(self):
+        self.orig_caches = (bitcoincash.core.sigcache.signature_cache,
+                            bitcoincash.core.sigcache.script_cache)
+        self.sig_cache = bitcoincash.core.sigcache.signature_cache = SignatureCache()
+        self.script_cache = bitcoincash.core.sigcache.script_cache = ScriptCache()
+
+        keys = [CKey(hashlib.sha256(bytes([i])).digest()) for i in range(2)]
+        self.spent_outputs = [CTxOut(1000 * (i + 1), P2PKHBitcoinAddress.from_pubkey(key.pub).to_scriptPubKey())
+                              for i, key in enumerate(keys)]
+        tx = CMutableTransaction([CMutableTxIn(COutPoint(b'\x01' * 32, i)) for i in range(2)],
+                                 [CMutableTxOut(1000, self.spent_outputs[0].scriptPubKey)])
+        self.tx = sign_inputs(tx, [(i, keys[i], txout.scriptPubKey, txout.nValue, SIGHASH_ALL | SIGHASH_FORKID)
+                                   for i, txout in enumerate(self.spent_outputs)],
+                              algorithm='ecdsa')
+        self.flags = (SCRIPT_VERIFY_P2SH, SCRIPT_ENABLE_SIGHASH_FORKID)
+
+    def tearDown(self):
+        (bitcoincash.core.sigcache.signature_cache,
+         bitcoincash.core.sigcache.script_cache) = self.orig_caches
+
+    def test(self):
+        VerifyTransactionScripts(self.tx, self.spent_outputs, self.flags)
+        self.assertEqual(len(self.script_cache), 1)
+        self.assertEqual(self.sig_cache.misses, 2)
+
+        # Script evaluation is skipped altogether
+        VerifyTransactionScripts(self.tx, self.spent_outputs, self.flags)
+        self.assertEqual(self.script_cache.hits, 1)
+        self.assertEqual(self.sig_cache.stats()['hits'], 0)
+
+        # The same flags as a bitmask, in any order, are the same entry
+        VerifyTransactionScripts(self.tx, self.spent_outputs,
+                                 SCRIPT_ENABLE_SIGHASH_FORKID | SCRIPT_VERIFY_P2SH)
+        self.assertEqual(self.script_cache.hits, 2)
+
+        # Other flags are a miss, but the signatures are cached
+        VerifyTransactionScripts(self.tx, self.spent_outputs, self.flags[1:])
+        self.assertEqual(self.sig_cache.hits, 2)
+
+    def test_invalid(self):
+        wrong_outputs = [self.spent_outputs[0], CTxOut(1, self.spent_outputs[1].scriptPubKey)]
+        for i in range(2):
+            with self.assertRaises(VerifyScriptError):
+                VerifyTransactionScripts(self.tx, wrong_outputs, self.flags)
+        self.assertEqual(len(self.script_cache), 0)
+
+        with self.assertRaises(ValueError):
+            VerifyTransactionScripts(self.tx, self.spent_outputs[:1], self.flags)
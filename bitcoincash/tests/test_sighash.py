@@ -12,6 +12,8 @@
 
 import json
 import os
+import random
+import struct
 import unittest
 
 from bitcoincash.core import *
@@ -32,6 +34,41 @@ def load_test_vectors(name):
             yield (tx, script, input_index, hashType, sighnature_hash)
 
 
+def copying_RawSignatureHashLegacy(script, txTo, inIdx, hashtype):
+    """RawSignatureHashLegacy() as it was, serializing a modified copy of txTo"""
+    HASH_ONE = b'\x01' + b'\x00' * 31
+
+    if inIdx >= len(txTo.vin):
+        return (HASH_ONE, "inIdx %d out of range (%d)" % (inIdx, len(txTo.vin)))
+    txtmp = CMutableTransaction.from_tx(txTo)
+
+    txtmp.vin = [CMutableTxIn(txin.prevout, b'', txin.nSequence) for txin in txTo.vin]
+    txtmp.vin[inIdx].scriptSig = FindAndDelete(script, CScript([OP_CODESEPARATOR]))
+
+    if (hashtype & 0x1f) == SIGHASH_NONE:
+        txtmp.vout = []
+        for i in range(len(txtmp.vin)):
+            if i != inIdx:
+                txtmp.vin[i].nSequence = 0
+
+    elif (hashtype & 0x1f) == SIGHASH_SINGLE:
+        outIdx = inIdx
+        if outIdx >= len(txtmp.vout):
+            return (HASH_ONE, "outIdx %d out of range (%d)" % (outIdx, len(txtmp.vout)))
+
+        tmp = txtmp.vout[outIdx]
+        txtmp.vout = [CTxOut() for i in range(outIdx)] + [tmp]
+        for i in range(len(txtmp.vin)):
+            if i != inIdx:
+                txtmp.vin[i].nSequence = 0
+
+    if hashtype & SIGHASH_ANYONECANPAY:
+        txtmp.vin = [txtmp.vin[inIdx]]
+
+    s = txtmp.serialize() + struct.pack(b"<i", hashtype)
+    return (Hash(s), None)
+
+
 
 class Test_SigHash(unittest.TestCase):
 
@@ -54,3 +91,49 @@ class Test_SigHash(unittest.TestCase):
 
             self.assertEqual(b2lx(sh), signature_hash)
 
+
+    def test_sighash_txdata(self):
+        for test in load_test_vectors('sighash.json'):
+            (tx, script, input_index, hashType, signature_hash) = test
+            txdata = PrecomputedTransactionData(tx)
+
+            # Hashes for the other inputs first, so the data is reused
+            for i in range(len(tx.vin)):
+                SignatureHash(script, tx, i, hashType, 0,
+                        legacy_allow = True, legacy_raw = True, txdata = txdata)
+            sh = SignatureHash(script, tx, input_index, hashType, 0,
+                    legacy_allow = True, legacy_raw = True, txdata = txdata)
+            self.assertEqual(b2lx(sh), signature_hash)
+
+    def test_sighash_streamed(self):
+        # The streamed hash matches serializing a modified copy of the
+        # transaction, on transactions with many inputs
+        rand = random.Random(0)
+        script = CScript([OP_DUP, OP_CODESEPARATOR, OP_HASH160, b'\x01' * 20, OP_EQUALVERIFY, OP_CHECKSIG])
+        hashtypes = [base | anyonecanpay
+                     for base in (0, SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE, 4)
+                     for anyonecanpay in (0, SIGHASH_ANYONECANPAY)]
+        for n_in, n_out in ((300, 5), (260, 300)):
+            tx = CTransaction([CTxIn(COutPoint(struct.pack(b'<I', i) * 8, rand.randrange(4)),
+                                     CScript(b'\x51' * rand.randrange(120)),
+                                     rand.choice((0, 1, 0xffffffff)))
+                               for i in range(n_in)],
+                              [CTxOut(i, CScript(b'\x51' * rand.randrange(30))) for i in range(n_out)],
+                              nLockTime=rand.randrange(1 << 32))
+            txdata = PrecomputedTransactionData(tx)
+
+            # First, last, around the number of outputs, and out of range
+            indexes = sorted({0, 1, n_out - 1, n_out, n_out + 1, n_in - 1, n_in} |
+                             set(rand.sample(range(n_in), 10)))
+            for inIdx in indexes:
+                for hashtype in hashtypes:
+                    expected = copying_RawSignatureHashLegacy(script, tx, inIdx, hashtype)
+                    self.assertEqual(RawSignatureHashLegacy(script, tx, inIdx, hashtype), expected)
+                    self.assertEqual(RawSignatureHashLegacy(script, tx, inIdx, hashtype, txdata=txdata),
+                                     expected)
+
+    def test_sighash_txdata_wrong_tx(self):
+        tx = CTransaction([CTxIn()], [CTxOut(0)])
+        with self.assertRaises(ValueError):
+            SignatureHash(CScript(), tx, 0, SIGHASH_ALL | SIGHASH_FORKID, 0,
+                          txdata = PrecomputedTransactionData(CTransaction([CTxIn()], [CTxOut(1)])))
@@ -11,11 +11,17 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import copy
 import json
+import pickle
 import unittest
 import os
 
+from io import BytesIO
+
 from bitcoincash.core import *
+from bitcoincash.core.script import CScript
+from bitcoincash.core.serialize import SerializationTruncationError
 from bitcoincash.core.scripteval import VerifyScript, SCRIPT_VERIFY_P2SH
 
 from bitcoincash.tests.test_scripteval import parse_script
@@ -79,6 +85,15 @@ class Test_CMutableOutPoint(unittest.TestCase):
 
         self.assertNotEqual(h1, outpoint.GetHash())
 
+    def test_serialize(self):
+        """CMutableOutPoint.serialize() is not cached"""
+        outpoint = CMutableOutPoint()
+
+        s1 = outpoint.serialize()
+        outpoint.n = 1
+
+        self.assertNotEqual(s1, outpoint.serialize())
+
 
 class Test_CTxIn(unittest.TestCase):
     def test_is_final(self):
@@ -120,6 +135,145 @@ class Test_CTransaction(unittest.TestCase):
         tx.vin.append(CTxIn())
         self.assertFalse(tx.is_coinbase())
 
+    def test_buffer_deserialize(self):
+        for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+            serialized = tx.serialize()
+
+            buf = memoryview(bytearray(b'\x00' + serialized + b'\x00'))
+            tx2, pos = CTransaction.buffer_deserialize(buf, 1)
+            self.assertEqual(pos, len(serialized) + 1)
+            self.assertEqual(tx2.serialize(), serialized)
+            self.assertIs(type(tx2.vin[0].scriptSig), CScript)
+            self.assertEqual(tx2.GetTxid(), Hash(serialized))
+
+            mutable_tx, pos = CMutableTransaction.buffer_deserialize(buf, 1)
+            self.assertEqual(mutable_tx.GetTxid(), Hash(serialized))
+            mutable_tx.nLockTime ^= 1
+            self.assertNotEqual(mutable_tx.GetTxid(), Hash(serialized))
+
+            for i in range(len(serialized)):
+                with self.assertRaises(SerializationTruncationError):
+                    CTransaction.deserialize(serialized[:i])
+
+    def test_buffer_serialize(self):
+        for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+            f = BytesIO()
+            tx.stream_serialize(f)
+            serialized = f.getvalue()
+
+            buf = bytearray(len(serialized) + 1)
+            self.assertEqual(tx.buffer_serialize(buf, 1), len(buf))
+            self.assertEqual(bytes(buf[1:]), serialized)
+            self.assertEqual(CMutableTransaction.from_tx(tx).serialize(), serialized)
+
+    def test_serialize_cached(self):
+        tx = CTransaction([CTxIn()], [CTxOut()])
+        self.assertIs(tx.serialize(), tx.serialize())
+
+    def test_GetSerializeSize(self):
+        for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+            self.assertEqual(tx.GetSerializeSize(), len(tx.serialize()))
+
+            mutable_tx = CMutableTransaction.from_tx(tx)
+            self.assertEqual(mutable_tx.GetSerializeSize(), len(tx.serialize()))
+            mutable_tx.vout.append(CMutableTxOut(0, CScript(b'\x00' * 0xfd)))
+            self.assertEqual(mutable_tx.GetSerializeSize(),
+                             len(mutable_tx.serialize()))
+
+            for txin in tx.vin:
+                self.assertEqual(txin.GetSerializeSize(), len(txin.serialize()))
+            for txout in tx.vout:
+                self.assertEqual(txout.GetSerializeSize(), len(txout.serialize()))
+
+    def test_from_tx_copy_on_write(self):
+        tx = CTransaction([CTxIn(COutPoint(b'\x01'*32, i)) for i in range(3)],
+                          [CTxOut(i) for i in range(3)])
+        serialized = tx.serialize()
+
+        mutable_tx = CMutableTransaction.from_tx(tx)
+        self.assertEqual(mutable_tx.serialize(), serialized)
+        self.assertEqual(CTransaction.from_tx(mutable_tx), tx)
+
+        # Items read through the lists are mutable; the original is left alone
+        mutable_tx.vin[1].prevout.n = 42
+        mutable_tx.vout[-1].nValue = 42
+        for txin in mutable_tx.vin:
+            txin.nSequence = 0
+        self.assertIsInstance(mutable_tx.vin[0], CMutableTxIn)
+        self.assertIsInstance(mutable_tx.vin[0].prevout, CMutableOutPoint)
+        self.assertEqual([txin.nSequence for txin in mutable_tx.vin], [0, 0, 0])
+        self.assertEqual(mutable_tx.vin[1].prevout.n, 42)
+        self.assertEqual(mutable_tx.vout[2].nValue, 42)
+        self.assertEqual(tx.serialize(), serialized)
+
+        # Copies of a mutable transaction are independent of it
+        mutable_tx2 = CMutableTransaction.from_tx(mutable_tx)
+        mutable_tx2.vin[0].nSequence = 1
+        mutable_tx2.vout[0].nValue = 1
+        self.assertEqual(mutable_tx.vin[0].nSequence, 0)
+        self.assertEqual(mutable_tx.vout[0].nValue, 0)
+
+    def test_from_tx_copy_on_write_reads(self):
+        tx = CTransaction([CTxIn(COutPoint(b'\x01'*32, i)) for i in range(3)],
+                          [CTxOut(i) for i in range(3)])
+        mutable_tx = CMutableTransaction.from_tx(tx)
+
+        # Reading doesn't copy anything
+        for txin in mutable_tx.vin:
+            self.assertFalse(txin.prevout.is_null())
+            self.assertEqual(txin.scriptSig, b'')
+        self.assertEqual([txout.nValue for txout in reversed(mutable_tx.vout)], [2, 1, 0])
+        self.assertEqual(mutable_tx.GetTxid(), tx.GetTxid())
+        for shared, original in ((mutable_tx.vin.shared(), tx.vin),
+                                 (mutable_tx.vout.shared(), tx.vout)):
+            self.assertTrue(all(a is b for a, b in zip(shared, original)))
+
+        # Only the items written to are copied, including through the prevout
+        mutable_tx.vin[0].prevout.n = 42
+        mutable_tx.vout[2].scriptPubKey = CScript([1])
+        self.assertEqual([a is b for a, b in zip(mutable_tx.vin.shared(), tx.vin)],
+                         [False, True, True])
+        self.assertEqual([a is b for a, b in zip(mutable_tx.vout.shared(), tx.vout)],
+                         [True, True, False])
+
+        tx2 = CTransaction.from_tx(mutable_tx)
+        self.assertEqual(tx2.vin[0].prevout, COutPoint(b'\x01'*32, 42))
+        self.assertIs(tx2.vin[1], tx.vin[1])
+        self.assertEqual(tx2.vout[2].scriptPubKey, CScript([1]))
+        self.assertEqual(tx.vin[0].prevout.n, 0)
+        self.assertEqual(tx.vout[2].scriptPubKey, b'')
+
+    def test_from_tx_copy_on_write_copies(self):
+        tx = CTransaction([CTxIn(COutPoint(b'\x01'*32, i)) for i in range(2)],
+                          [CTxOut(i) for i in range(2)])
+        serialized = tx.serialize()
+
+        # Every way of copying the lists gives the mutable items
+        for name, copy_vin in (('copy', lambda vin: vin.copy()),
+                               ('add', lambda vin: vin + []),
+                               ('radd', lambda vin: [] + vin),
+                               ('mul', lambda vin: vin * 1),
+                               ('rmul', lambda vin: 1 * vin),
+                               ('copy.copy', copy.copy),
+                               ('copy.deepcopy', copy.deepcopy),
+                               ('pickle', lambda vin: pickle.loads(pickle.dumps(vin)))):
+            vin = copy_vin(CMutableTransaction.from_tx(tx).vin)
+            self.assertEqual(len(vin), 2, name)
+            for txin in vin:
+                self.assertIsInstance(txin, CMutableTxIn, name)
+                txin.nSequence = 5
+        self.assertEqual(tx.serialize(), serialized)
+
+        mutable_tx = CMutableTransaction.from_tx(tx)
+        self.assertEqual(len(mutable_tx.vout * 2), 4)
+        with self.assertRaises(TypeError):
+            mutable_tx.vin + ()
+
+        mutable_tx2 = copy.deepcopy(mutable_tx)
+        mutable_tx2.vout[0].nValue = 42
+        self.assertEqual(mutable_tx.vout[0].nValue, 0)
+        self.assertEqual(mutable_tx.serialize(), serialized)
+
     def test_tx_valid(self):
         for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
             try:
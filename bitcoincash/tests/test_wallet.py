@@ -14,8 +14,28 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import hashlib
 import unittest
 
-from bitcoincash.core import b2x, x
-from bitcoincash.core.script import CScript, IsLowDERSignature
+from bitcoincash.core import (
+        b2x,
+        x,
+        COutPoint,
+        CMutableTransaction,
+        CMutableTxIn,
+        CMutableTxOut,
+        CTransaction,
+        )
+from bitcoincash.core.script import (
+        CScript,
+        IsLowDERSignature,
+        OP_2,
+        OP_CHECKMULTISIG,
+        OP_CHECKSIG,
+        OP_DUP,
+        OP_RETURN,
+        SIGHASH_ALL,
+        SIGHASH_FORKID,
+        )
+from bitcoincash.core.scripteval import VerifyScript, SCRIPT_ENABLE_SIGHASH_FORKID
+from bitcoincash.core import schnorr
 from bitcoincash.core.key import CPubKey, is_libsec256k1_available, use_libsecp256k1_for_signing
 from bitcoincash.wallet import *
 import bitcoincash.cashaddr
@@ -312,3 +332,92 @@ class Test_RFC6979(unittest.TestCase):
             assert(str(sig) == vector[3])
 
         use_libsecp256k1_for_signing(False)
+
+class Test_sign_inputs(unittest.TestCase):
+    def setUp(self):
+        self.keys = [CKey(hashlib.sha256(bytes([i])).digest()) for i in range(2)]
+        self.scriptPubKeys = [P2PKHBitcoinAddress.from_pubkey(self.keys[0].pub).to_scriptPubKey(),
+                              CScript([self.keys[1].pub, OP_CHECKSIG]),
+                              P2PKHBitcoinAddress.from_pubkey(self.keys[0].pub).to_scriptPubKey()]
+        self.amounts = [1000, 2000, 3000]
+        self.tx = CMutableTransaction([CMutableTxIn(COutPoint(b'\x01' * 32, i)) for i in range(3)],
+                                      [CMutableTxOut(5000, self.scriptPubKeys[0])])
+
+    def check_signed(self, algorithm, workers):
+        hashtype = SIGHASH_ALL | SIGHASH_FORKID
+        signed = sign_inputs(self.tx,
+                             [(i, self.keys[i % 2], self.scriptPubKeys[i], self.amounts[i], hashtype)
+                              for i in range(3)],
+                             algorithm=algorithm, workers=workers)
+        self.assertIsInstance(signed, CTransaction)
+        self.assertEqual(self.tx.vin[0].scriptSig, CScript())
+
+        for i in range(3):
+            VerifyScript(signed.vin[i].scriptSig, self.scriptPubKeys[i], signed, i,
+                         flags=(SCRIPT_ENABLE_SIGHASH_FORKID,), amount=self.amounts[i])
+
+    def test_ecdsa(self):
+        self.check_signed('ecdsa', 1)
+
+    def test_ecdsa_workers(self):
+        self.check_signed('ecdsa', 2)
+
+    @unittest.skipIf(not schnorr.is_available(), "Schnorr not available on this platform")
+    def test_schnorr(self):
+        self.check_signed('schnorr', 1)
+
+    def test_unsigned_inputs_shared(self):
+        tx = CTransaction.from_tx(self.tx)
+        signed = sign_inputs(tx, [(1, self.keys[1], self.scriptPubKeys[1], 2000, SIGHASH_ALL | SIGHASH_FORKID)],
+                             algorithm='ecdsa')
+        self.assertIs(signed.vin[0], tx.vin[0])
+        self.assertIs(signed.vin[2], tx.vin[2])
+        self.assertIs(signed.vout[0], tx.vout[0])
+        self.assertNotEqual(signed.vin[1].scriptSig, CScript())
+
+    def test_wrong_key(self):
+        with self.assertRaises(ValueError):
+            sign_inputs(self.tx, [(0, self.keys[1], self.scriptPubKeys[0], 1000, SIGHASH_ALL | SIGHASH_FORKID)],
+                        algorithm='ecdsa')
+
+class Test_classify_scripts(unittest.TestCase):
+    def test(self):
+        pubkey = x('0378d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71')
+        uncompressed_pubkey = x('0478d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71a1518063243acd4dfe96b66e3f2ec8013c8e072cd09b3834a19f81f659cc3455')
+        p2pkh = P2PKHBitcoinAddress.from_pubkey(pubkey)
+        p2sh = P2SHBitcoinAddress.from_redeemScript(CScript([OP_2]))
+
+        def T(scriptPubKey, script_type, address=None):
+            for s in (scriptPubKey, bytes(scriptPubKey), memoryview(bytes(scriptPubKey))):
+                result = classify_scripts([CScript([OP_RETURN]), s])
+                self.assertEqual(list(result.types), [SCRIPT_TYPE_NULLDATA, script_type])
+                self.assertEqual(len(result.hashes), 40)
+                self.assertEqual(result.get_address(1), address)
+                if address is None:
+                    self.assertIsNone(result.get_hash(1))
+                    self.assertEqual(result.hashes[20:], b'\x00' * 20)
+                else:
+                    self.assertEqual(result.get_hash(1), address.to_bytes())
+
+        T(p2pkh.to_scriptPubKey(), SCRIPT_TYPE_P2PKH, p2pkh)
+        T(p2sh.to_scriptPubKey(), SCRIPT_TYPE_P2SH, p2sh)
+        T(CScript([pubkey, OP_CHECKSIG]), SCRIPT_TYPE_P2PK, p2pkh)
+        T(CScript([uncompressed_pubkey, OP_CHECKSIG]), SCRIPT_TYPE_P2PK,
+          P2PKHBitcoinAddress.from_pubkey(uncompressed_pubkey))
+        T(CScript([1, pubkey, uncompressed_pubkey, 2, OP_CHECKMULTISIG]), SCRIPT_TYPE_MULTISIG)
+        T(CScript([OP_RETURN, b'hello', 1]), SCRIPT_TYPE_NULLDATA)
+
+        T(CScript(), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript([OP_RETURN, OP_DUP]), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript(x('6a4c')), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript([b'\x00' * 33, OP_CHECKSIG]), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript([3, pubkey, pubkey, 2, OP_CHECKMULTISIG]), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript([1, pubkey, pubkey, 3, OP_CHECKMULTISIG]), SCRIPT_TYPE_NONSTANDARD)
+        T(CScript([1, pubkey[:-1], 1, OP_CHECKMULTISIG]), SCRIPT_TYPE_NONSTANDARD)
+
+        # Non-canonical pushes don't match
+        T(CScript(x('76a94c14') + p2pkh.to_bytes() + x('88ac')), SCRIPT_TYPE_NONSTANDARD)
+
+    def test_empty(self):
+        result = classify_scripts([])
+        self.assertEqual((len(result.types), result.hashes), (0, b''))
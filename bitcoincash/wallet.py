@@ -17,6 +17,8 @@ scriptPubKeys; currently there is no actual wallet support implemented.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import array
+import collections
 import sys
 
 _bord = ord
@@ -29,6 +31,7 @@ import bitcoincash.cashaddr
 import bitcoincash.core
 import bitcoincash.core.key
 import bitcoincash.core.script as script
+import bitcoincash.parallel
 
 class CBitcoinAddressError(Exception):
     """Raised when an invalid Bitcoin address is encountered"""
@@ -286,6 +289,225 @@ def legacy_to_cashaddr(legacy_addr):
     return bitcoincash.cashaddr.encode_full(
             bitcoincash.params.CASHADDR_PREFIX, addr_type, legacy.to_bytes())
 
+# Types of scriptPubKey returned by classify_scripts()
+SCRIPT_TYPE_NONSTANDARD = 0
+SCRIPT_TYPE_P2PKH = 1
+SCRIPT_TYPE_P2SH = 2
+SCRIPT_TYPE_P2PK = 3
+SCRIPT_TYPE_MULTISIG = 4
+SCRIPT_TYPE_NULLDATA = 5
+
+_NO_HASH = b'\x00' * 20
+
+# Length of a pubkey, by its first byte, as CPubKey::GetLen()
+_PUBKEY_LENGTHS = {2: 33, 3: 33, 4: 65, 6: 65, 7: 65}
+
+def _is_push_only(scriptPubKey, i):
+    """Test if scriptPubKey[i:] only contains valid pushdata ops"""
+    n = len(scriptPubKey)
+    while i < n:
+        opcode = scriptPubKey[i]
+        i += 1
+        if opcode > script.OP_16:
+            return False
+        elif opcode < script.OP_PUSHDATA1:
+            i += opcode
+        elif opcode == script.OP_PUSHDATA1:
+            if i + 1 > n:
+                return False
+            i += 1 + scriptPubKey[i]
+        elif opcode == script.OP_PUSHDATA2:
+            if i + 2 > n:
+                return False
+            i += 2 + (scriptPubKey[i] | scriptPubKey[i+1] << 8)
+        elif opcode == script.OP_PUSHDATA4:
+            if i + 4 > n:
+                return False
+            i += 4 + (scriptPubKey[i] | scriptPubKey[i+1] << 8 |
+                      scriptPubKey[i+2] << 16 | scriptPubKey[i+3] << 24)
+    return i == n
+
+def _is_bare_multisig(scriptPubKey):
+    """Test if scriptPubKey is OP_m <pubkey>... OP_n OP_CHECKMULTISIG"""
+    n = len(scriptPubKey)
+    required = scriptPubKey[0] - (script.OP_1 - 1)
+    keys = scriptPubKey[n-2] - (script.OP_1 - 1)
+    if not (1 <= required <= keys <= 16):
+        return False
+
+    i = 1
+    for k in range(keys):
+        if i + 1 >= n:
+            return False
+        size = scriptPubKey[i]
+        if _PUBKEY_LENGTHS.get(scriptPubKey[i+1]) != size:
+            return False
+        i += 1 + size
+    return i == n - 2
+
+class ScriptClassification(collections.namedtuple('ScriptClassification', ['types', 'hashes'])):
+    """Result of classify_scripts()
+
+    types:  array of the SCRIPT_TYPE_* of every script
+    hashes: bytes of the 20 byte hash of every script, concatenated: the
+            pubkey hash of P2PKH and P2PK scripts, and the script hash of
+            P2SH scripts. Zeros for the other types.
+    """
+    __slots__ = ()
+
+    def get_hash(self, i):
+        """Return the hash of script i, or None if it has none"""
+        if self.types[i] in (SCRIPT_TYPE_P2PKH, SCRIPT_TYPE_P2SH, SCRIPT_TYPE_P2PK):
+            return self.hashes[i*20:i*20+20]
+        return None
+
+    def get_address(self, i):
+        """Return the address paid to by script i, or None if it has none
+
+        P2PK scripts are paid to the P2PKH address of the pubkey.
+        """
+        script_type = self.types[i]
+        if script_type == SCRIPT_TYPE_P2SH:
+            return P2SHBitcoinAddress.from_bytes(self.get_hash(i),
+                    bitcoincash.params.CASHADDR_PREFIX, bitcoincash.cashaddr.SCRIPT_TYPE)
+        elif script_type in (SCRIPT_TYPE_P2PKH, SCRIPT_TYPE_P2PK):
+            return P2PKHBitcoinAddress.from_bytes(self.get_hash(i),
+                    bitcoincash.params.CASHADDR_PREFIX, bitcoincash.cashaddr.PUBKEY_TYPE)
+        return None
+
+def classify_scripts(scripts):
+    """Classify scriptPubKeys in bulk
+
+    scripts - Iterable of scriptPubKeys; any bytes-like objects, such as
+              CScripts or memoryviews of a serialized block
+
+    Returns a ScriptClassification. Scripts are matched by byte pattern, as
+    Bitcoin Core's Solver() does, so scripts using non-canonical pushes are
+    nonstandard. Bare multisig scripts have 1 to 16 compressed or
+    uncompressed pubkeys; null data scripts are OP_RETURN followed only by
+    pushes, whatever their size.
+    """
+    types = array.array('B')
+    hashes = bytearray()
+    Hash160 = bitcoincash.core.Hash160
+    OP_DUP = script.OP_DUP
+    OP_HASH160 = script.OP_HASH160
+    OP_EQUAL = script.OP_EQUAL
+    OP_EQUALVERIFY = script.OP_EQUALVERIFY
+    OP_CHECKSIG = script.OP_CHECKSIG
+    OP_CHECKMULTISIG = script.OP_CHECKMULTISIG
+    OP_RETURN = script.OP_RETURN
+
+    for s in scripts:
+        n = len(s)
+        if (n == 25 and s[0] == OP_DUP and s[1] == OP_HASH160 and s[2] == 0x14
+                and s[23] == OP_EQUALVERIFY and s[24] == OP_CHECKSIG):
+            types.append(SCRIPT_TYPE_P2PKH)
+            hashes += s[3:23]
+
+        elif n == 23 and s[0] == OP_HASH160 and s[1] == 0x14 and s[22] == OP_EQUAL:
+            types.append(SCRIPT_TYPE_P2SH)
+            hashes += s[2:22]
+
+        elif ((n == 35 or n == 67) and s[0] == n - 2 and s[n-1] == OP_CHECKSIG
+                and _PUBKEY_LENGTHS.get(s[1]) == n - 2):
+            types.append(SCRIPT_TYPE_P2PK)
+            hashes += Hash160(s[1:n-1])
+
+        elif n and s[0] == OP_RETURN and _is_push_only(s, 1):
+            types.append(SCRIPT_TYPE_NULLDATA)
+            hashes += _NO_HASH
+
+        elif n >= 3 and s[n-1] == OP_CHECKMULTISIG and _is_bare_multisig(s):
+            types.append(SCRIPT_TYPE_MULTISIG)
+            hashes += _NO_HASH
+
+        else:
+            types.append(SCRIPT_TYPE_NONSTANDARD)
+            hashes += _NO_HASH
+
+    return ScriptClassification(types, bytes(hashes))
+
+def _sign_hash(key, sighash, algorithm):
+    if algorithm == 'schnorr':
+        return key.signSchnorr(sighash)
+    else:
+        return key.signECDSA(sighash)
+
+def _sign_hashes(job, algorithm):
+    """Sign a list of sighashes with one key, in a worker process"""
+    secret, compressed, sighashes = job
+    key = CKey(secret, compressed)
+    return [_sign_hash(key, sighash, algorithm) for sighash in sighashes]
+
+def _is_p2pkh_spend(scriptPubKey, pubkey):
+    """Check pubkey can spend scriptPubKey; returns True for P2PKH, False for P2PK"""
+    if (len(scriptPubKey) == 25
+            and scriptPubKey[0:3] == b'\x76\xa9\x14'
+            and scriptPubKey[23:25] == b'\x88\xac'):
+        if scriptPubKey[3:23] != bitcoincash.core.Hash160(pubkey):
+            raise ValueError('key does not match P2PKH scriptPubKey %r' % scriptPubKey)
+        return True
+
+    elif scriptPubKey == script.CScript([pubkey, script.OP_CHECKSIG]):
+        return False
+
+    raise ValueError('can only sign P2PKH scriptPubKeys, or P2PK of the key; got %r' % scriptPubKey)
+
+def sign_inputs(tx, inputs, algorithm='schnorr', workers=1):
+    """Sign inputs of a transaction
+
+    tx        - Transaction to sign
+    inputs    - Iterable of (idx, key, scriptPubKey, amount, hashtype) of the
+                inputs to sign, where key is a CKey and scriptPubKey is the
+                P2PKH or P2PK scriptPubKey of the output spent. hashtype must
+                include SIGHASH_FORKID.
+    algorithm - 'schnorr' or 'ecdsa'
+    workers   - Number of worker processes to sign with; None for the number
+                of CPUs. With 1 the inputs are signed in this process.
+
+                Workers are sent the raw private keys, pickled over a pipe, so
+                with more than one the secrets leave this process. Leave
+                workers at 1 where that matters.
+
+    The signature hashes share one PrecomputedTransactionData, and the inputs
+    are grouped by key so that every worker sets up each key only once.
+
+    Returns a CTransaction with the scriptSigs of the inputs set.
+    """
+    if algorithm not in ('schnorr', 'ecdsa'):
+        raise ValueError("algorithm must be 'schnorr' or 'ecdsa'; got %r" % algorithm)
+
+    tx = bitcoincash.core.CTransaction.from_tx(tx)
+    txdata = script.PrecomputedTransactionData(tx)
+
+    # pubkey -> (key, [(idx, is_p2pkh, hashtype, sighash), ...])
+    groups = collections.OrderedDict()
+    for idx, key, scriptPubKey, amount, hashtype in inputs:
+        is_p2pkh = _is_p2pkh_spend(scriptPubKey, key.pub)
+        sighash = script.SignatureHash(scriptPubKey, tx, idx, hashtype, amount, txdata=txdata)
+        group = groups.setdefault(bytes(key.pub), (key, []))
+        group[1].append((idx, is_p2pkh, hashtype, sighash))
+
+    if workers == 1:
+        sigs = ([_sign_hash(key, sighash, algorithm) for idx, is_p2pkh, hashtype, sighash in group]
+                for key, group in groups.values())
+    else:
+        jobs = ((key._cec_key.get_raw_privkey(), key.is_compressed,
+                 [sighash for idx, is_p2pkh, hashtype, sighash in group])
+                for key, group in groups.values())
+        sigs = bitcoincash.parallel.map_ordered(_sign_hashes, jobs, workers, (algorithm,))
+
+    # The signature hashes don't cover the scriptSigs, so they can be set now.
+    # Only the inputs signed are copied.
+    tx = bitcoincash.core.CMutableTransaction.from_tx(tx)
+    for (key, group), group_sigs in zip(groups.values(), sigs):
+        for (idx, is_p2pkh, hashtype, sighash), sig in zip(group, group_sigs):
+            sig += bytes([hashtype])
+            tx.vin[idx].scriptSig = script.CScript([sig, key.pub] if is_p2pkh else [sig])
+
+    return bitcoincash.core.CTransaction.from_tx(tx)
+
 
 __all__ = (
         'CBitcoinAddressError',
@@ -296,4 +518,13 @@ __all__ = (
         'CBitcoinSecretError',
         'CBitcoinSecret',
         'legacy_to_cashaddr',
+        'ScriptClassification',
+        'classify_scripts',
+        'SCRIPT_TYPE_NONSTANDARD',
+        'SCRIPT_TYPE_P2PKH',
+        'SCRIPT_TYPE_P2SH',
+        'SCRIPT_TYPE_P2PK',
+        'SCRIPT_TYPE_MULTISIG',
+        'SCRIPT_TYPE_NULLDATA',
+        'sign_inputs',
 )
@@ -32,13 +32,13 @@ try:
     n = int(sys.argv[1])
 
     if len(sys.argv) == 3:
-        bitcoin.SelectParams(sys.argv[2])
+        bitcoincash.SelectParams(sys.argv[2])
 except Exception as ex:
     print('Usage: %s <block-height> [network=(mainnet|testnet|regtest)] > bootstrap.dat' % sys.argv[0], file=sys.stderr)
     sys.exit(1)
 
 
-proxy = bitcoin.rpc.Proxy()
+proxy = bitcoincash.rpc.Proxy()
 
 total_bytes = 0
 start_time = time.time()
@@ -55,6 +55,6 @@ for i in range(n + 1):
              i, len(block_bytes)),
           file=sys.stderr)
 
-    fd.write(bitcoincash.params.DISK_MAGIC)
+    fd.write(bitcoincash.params.DB_MAGIC)
     fd.write(struct.pack('<i', len(block_bytes)))
     fd.write(block_bytes)